@@ -0,0 +1,17 @@
+"""Settings for the test suite: python manage.py test --settings=InvetoryManager.test_settings"""
+import tempfile
+from pathlib import Path
+from .settings import *  # noqa: F401,F403
+
+# Local memory, so tests never read entries left by the server or by a previous run
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory-test',
+        'KEY_PREFIX': 'inventory',
+    },
+}
+CACHE_ATOMIC_INCR = True
+
+# Export files written by tests stay out of the project tree
+EXPORT_ROOT = Path(tempfile.gettempdir()) / 'inventory-test-exports'
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+import re
+from django.db import migrations, models
+
+
+def seed_expense_sequence(apps, schema_editor):
+    """Счетчик продолжает уже выданные номера вида РС-000001"""
+    DocumentSequence = apps.get_model('products', 'DocumentSequence')
+    ExpenseInvoice = apps.get_model('expenses', 'ExpenseInvoice')
+
+    last_value = 0
+    for number in ExpenseInvoice.objects.filter(invoice_number__startswith='РС-').values_list('invoice_number', flat=True):
+        match = re.fullmatch(r'РС-(\d+)', number)
+        if match:
+            last_value = max(last_value, int(match.group(1)))
+
+    sequence, created = DocumentSequence.objects.get_or_create(prefix='РС', defaults={'last_value': last_value})
+    if not created and sequence.last_value < last_value:
+        sequence.last_value = last_value
+        sequence.save(update_fields=['last_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        ('products', '0011_document_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expenseinvoice',
+            name='invoice_number',
+            field=models.CharField(blank=True, help_text='Оставьте пустым, чтобы номер присвоился при сохранении', max_length=50, unique=True, verbose_name='Номер накладной'),
+        ),
+        migrations.RunPython(seed_expense_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_completed_at(apps, schema_editor):
+    # Для проведенных ранее накладных дата проведения — дата последнего изменения
+    ExpenseInvoice = apps.get_model('expenses', 'ExpenseInvoice')
+    ExpenseInvoice.objects.filter(status='completed', completed_at__isnull=True).update(completed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_invoice_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expenseinvoice',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата проведения'),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from products.models import Product
+from products.sequences import assign_number
 
 User = get_user_model()
 
@@ -20,13 +21,15 @@ class ExpenseReason(models.Model):
 
 class ExpenseInvoice(models.Model):
     """Накладная расхода товара"""
+    NUMBER_PREFIX = 'РС'
     STATUS_CHOICES = [
         ('draft', 'Черновик'),
         ('completed', 'Завершена'),
         ('cancelled', 'Отменена'),
     ]
 
-    invoice_number = models.CharField(max_length=50, unique=True, verbose_name='Номер накладной')
+    invoice_number = models.CharField(max_length=50, unique=True, blank=True, verbose_name='Номер накладной',
+                                      help_text='Оставьте пустым, чтобы номер присвоился при сохранении')
     expense_date = models.DateField(verbose_name='Дата расхода')
     reason = models.ForeignKey(ExpenseReason, on_delete=models.PROTECT, verbose_name='Причина расхода')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft', verbose_name='Статус')
@@ -35,6 +38,7 @@ class ExpenseInvoice(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name='Создал')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата проведения')
 
     class Meta:
         verbose_name = 'Накладная расхода'
@@ -44,6 +48,14 @@ class ExpenseInvoice(models.Model):
     def __str__(self):
         return f"Накладная расхода {self.invoice_number} от {self.expense_date}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # Номер занимается в той же транзакции, что и сама накладная
+        with transaction.atomic():
+            assign_number(self, self.NUMBER_PREFIX)
+            super().save(*args, **kwargs)
+
     def update_total_amount(self):
         """Обновление общей суммы накладной"""
         from django.db.models import Sum
@@ -53,6 +65,25 @@ class ExpenseInvoice(models.Model):
         self.total_amount = total
         self.save(update_fields=['total_amount'])
 
+    def add_items(self, items):
+        """Запись строк накладной одним bulk_create и один пересчет суммы в конце.
+
+        Цены товаров читаются одним запросом на все строки, а не по одной
+        через item.product. Построчный save() пересчитывает сумму после
+        каждой строки, поэтому для накладных из многих строк используется
+        этот метод.
+        """
+        items = list(items)
+        prices = dict(Product.objects.filter(pk__in={item.product_id for item in items}).values_list('pk', 'price'))
+        for item in items:
+            if item.product_id not in prices:
+                raise Product.DoesNotExist(f'Товар с id {item.product_id} не найден')
+            item.invoice = self
+            item.total_price = item.quantity * prices[item.product_id]
+        ExpenseInvoiceItem.objects.bulk_create(items)
+        self.update_total_amount()
+        return items
+
 
 class ExpenseInvoiceItem(models.Model):
     """Строка накладной расхода"""
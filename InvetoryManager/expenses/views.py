@@ -3,11 +3,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.db import transaction
+from django.utils import timezone
 from django.core.paginator import Paginator
 from django.db.models import Q
 from .models import ExpenseInvoice, ExpenseInvoiceItem, ExpenseReason
 from .forms import ExpenseInvoiceForm, ExpenseInvoiceItemFormSet, ExpenseReasonForm
-from products.models import StockTransaction, Product
+from products.models import StockTransaction
+from products.ledger import apply_transactions, InsufficientStock
+from users.view_cache import render_cached
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -21,8 +24,10 @@ def is_admin_or_manager(user):
 @user_passes_test(is_admin_or_manager)
 def expense_reason_list(request):
     """Список причин расхода"""
-    reasons = ExpenseReason.objects.all().order_by('name')
-    return render(request, 'expenses/expense_reason_list.html', {'reasons': reasons})
+    return render_cached(
+        request, 'expense_reason_list', 'expenses/expense_reason_list.html', 'Причины расхода',
+        lambda: {'reasons': ExpenseReason.objects.all().order_by('name')}
+    )
 
 
 @login_required
@@ -67,10 +72,7 @@ def expense_invoice_create(request):
                     invoice.created_by = request.user
                     invoice.save()
 
-                    instances = formset.save(commit=False)
-                    for instance in instances:
-                        instance.invoice = invoice
-                        instance.save()
+                    invoice.add_items(formset.save(commit=False))
 
                     for instance in formset.deleted_objects:
                         instance.delete()
@@ -81,10 +83,7 @@ def expense_invoice_create(request):
             except Exception as e:
                 messages.error(request, f'Ошибка при создании накладной: {str(e)}')
     else:
-        last_invoice = ExpenseInvoice.objects.order_by('-id').first()
-        next_number = f"РС-{(last_invoice.id + 1) if last_invoice else 1:06d}" if last_invoice else "РС-000001"
-
-        form = ExpenseInvoiceForm(initial={'invoice_number': next_number})
+        form = ExpenseInvoiceForm()
         formset = ExpenseInvoiceItemFormSet()
 
     return render(request, 'expenses/expense_invoice_form.html', {
@@ -111,37 +110,36 @@ def expense_invoice_detail(request, pk):
 @user_passes_test(is_admin_or_manager)
 def expense_invoice_complete(request, pk):
     """Завершение накладной расхода - уменьшение остатков"""
-    invoice = get_object_or_404(ExpenseInvoice, pk=pk)
-
-    if invoice.status != 'draft':
-        messages.error(request, 'Накладная уже обработана или отменена!')
-        return redirect('expenses:expense_invoice_detail', pk=pk)
+    invoice = get_object_or_404(ExpenseInvoice.objects.select_related('reason'), pk=pk)
 
     try:
         with transaction.atomic():
-            for item in invoice.expenseinvoiceitem_set.all():
-                if item.product.quantity < item.quantity:
-                    messages.error(request, f'Недостаточно товара "{item.product.name}" на складе!')
-                    return redirect('expenses:expense_invoice_detail', pk=pk)
-
-            for item in invoice.expenseinvoiceitem_set.all():
-                product = item.product
-                product.quantity -= item.quantity
-                product.save()
-
-                StockTransaction.objects.create(
-                    product=product,
-                    transaction_type='out',
-                    quantity=item.quantity,
-                    user=request.user,
-                    comment=f'Расход по накладной {invoice.invoice_number}. Причина: {invoice.reason.name}'
-                )
-
-            invoice.status = 'completed'
-            invoice.save()
+            # Условный UPDATE не дает провести накладную дважды при параллельных запросах
+            now = timezone.now()
+            if not ExpenseInvoice.objects.filter(pk=pk, status='draft').update(
+                status='completed', updated_at=now, completed_at=now
+            ):
+                messages.error(request, 'Накладная уже обработана или отменена!')
+                return redirect('expenses:expense_invoice_detail', pk=pk)
+
+            apply_transactions(
+                (
+                    StockTransaction(
+                        product_id=product_id,
+                        transaction_type='out',
+                        quantity=quantity,
+                        comment=f'Расход по накладной {invoice.invoice_number}. Причина: {invoice.reason.name}'
+                    )
+                    for product_id, quantity in invoice.expenseinvoiceitem_set.values_list('product_id', 'quantity')
+                ),
+                request.user
+            )
 
         messages.success(request, 'Накладная расхода успешно завершена! Остатки обновлены.')
 
+    except InsufficientStock as e:
+        messages.error(request, f'Недостаточно товара "{e.product.name}" на складе!')
+
     except Exception as e:
         messages.error(request, f'Ошибка при завершении накладной: {str(e)}')
 
@@ -181,17 +179,10 @@ def expense_invoice_create_simple(request):
                     items_data = request.POST.get('items_data', '[]')
                     items = json.loads(items_data)
 
-                    for item in items:
-                        product = Product.objects.get(id=item['product_id'])
-                        quantity = int(item['quantity'])
-
-                        ExpenseInvoiceItem.objects.create(
-                            invoice=invoice,
-                            product=product,
-                            quantity=quantity
-                        )
-
-                    invoice.update_total_amount()
+                    invoice.add_items(
+                        ExpenseInvoiceItem(product_id=int(item['product_id']), quantity=int(item['quantity']))
+                        for item in items
+                    )
 
                     messages.success(request, 'Накладная расхода успешно создана!')
                     return redirect('expenses:expense_invoice_list')
@@ -201,23 +192,9 @@ def expense_invoice_create_simple(request):
         else:
             messages.error(request, 'Пожалуйста, исправьте ошибки в форме')
     else:
-        last_invoice = ExpenseInvoice.objects.order_by('-id').first()
-        next_number = f"РС-{(last_invoice.id + 1) if last_invoice else 1:06d}" if last_invoice else "РС-000001"
-        form = ExpenseInvoiceForm(initial={'invoice_number': next_number})
-
-    products_data = []
-    for product in Product.objects.all():
-        products_data.append({
-            'id': product.id,
-            'name': product.name,
-            'sku': product.sku,
-            'price': float(product.price),
-            'quantity': product.quantity,
-            'unit': product.unit
-        })
+        form = ExpenseInvoiceForm()
 
     return render(request, 'expenses/expense_invoice_form_simple.html', {
         'form': form,
-        'products': json.dumps(products_data),
         'title': 'Создать накладную расхода'
     })
\ No newline at end of file
@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.db import transaction
+from users.cache_counters import adjust_counter
+from .models import Notification
+
+# Счетчик перечитывается из базы не реже, чем раз в UNREAD_COUNT_TIMEOUT
+# секунд, даже если какое-то изменение прошло мимо adjust_unread_count
+UNREAD_COUNT_TIMEOUT = 300
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    """Число непрочитанных уведомлений из кеша; COUNT(*) только при промахе"""
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.add(_key(user_id), count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Изменить счетчик после коммита транзакции.
+
+    Если счетчика в кеше нет или incr бэкенда не атомарен, счетчик посчитает
+    следующий get_unread_count (users/cache_counters.py).
+    """
+    def apply():
+        count = adjust_counter(_key(user_id), delta)
+        if count is not None and count < 0:
+            cache.delete(_key(user_id))
+
+    if delta:
+        transaction.on_commit(apply)
+
+
+def reset_unread_count(user_id):
+    transaction.on_commit(lambda: cache.delete(_key(user_id)))
@@ -0,0 +1,88 @@
+import threading
+from collections import Counter
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from products.models import Product
+from .counters import adjust_unread_count
+from .models import Notification
+
+User = get_user_model()
+
+LOW_STOCK_RECIPIENT_ROLES = ['admin', 'manager']
+
+_local = threading.local()
+
+
+def _flush_low_stock():
+    product_ids = getattr(_local, 'product_ids', None)
+    if not product_ids:
+        return
+    _local.product_ids = set()
+    send_low_stock_notifications(product_ids)
+
+
+def queue_low_stock(product_ids):
+    """Отложить уведомления о низком запасе до коммита транзакции.
+
+    Товары копятся в наборе потока, и каждый вызов регистрирует сброс
+    набора через on_commit. Первый сброс после коммита отправляет все
+    товары транзакции одним пакетом, остальные находят набор пустым. Вне
+    транзакции набор отправляется сразу. Если колбэк снят откатом, товары
+    уйдут со следующим коммитом: остаток перечитывается при отправке, а
+    повторные уведомления отсекаются.
+    """
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+
+    pending = getattr(_local, 'product_ids', None)
+    if pending is None:
+        pending = _local.product_ids = set()
+    pending.update(product_ids)
+    transaction.on_commit(_flush_low_stock)
+
+
+def send_low_stock_notifications(product_ids):
+    """Уведомления администраторам и менеджерам одним bulk_create.
+
+    Остаток перечитывается на момент отправки. Пользователь, у которого
+    уже есть непрочитанное уведомление по товару, второе не получает.
+    """
+    products = list(Product.objects.filter(
+        id__in=product_ids,
+        low_stock=True,
+        min_stock__gt=0
+    ).only('id', 'name', 'sku', 'quantity'))
+    if not products:
+        return []
+
+    recipient_ids = list(User.objects.filter(role__in=LOW_STOCK_RECIPIENT_ROLES).values_list('id', flat=True))
+    if not recipient_ids:
+        return []
+
+    already_notified = set(Notification.objects.filter(
+        user_id__in=recipient_ids,
+        is_read=False,
+        notification_type='low_stock',
+        related_object_type='product',
+        related_object_id__in=[product.id for product in products]
+    ).values_list('user_id', 'related_object_id'))
+
+    notifications = [
+        Notification(
+            user_id=user_id,
+            title='Низкий запас товара',
+            message=f'Товар "{product.name}" (артикул: {product.sku}) достиг минимального запаса. Текущий остаток: {product.quantity}',
+            notification_type='low_stock',
+            related_object_id=product.id,
+            related_object_type='product'
+        )
+        for product in products
+        for user_id in recipient_ids
+        if (user_id, product.id) not in already_notified
+    ]
+    created = Notification.objects.bulk_create(notifications, batch_size=500)
+    # bulk_create не отправляет post_save, счетчики обновляются здесь
+    for user_id, count in Counter(notification.user_id for notification in created).items():
+        adjust_unread_count(user_id, count)
+    return created
@@ -26,6 +26,13 @@ class Notification(models.Model):
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='notif_user_created_idx'),
+            # filter(is_read=False) дает WHERE NOT "is_read", по которому
+            # составной индекс с is_read не читается; частичный индекс с тем же
+            # условием содержит только непрочитанные уведомления
+            models.Index(fields=['user', 'created_at'], condition=models.Q(is_read=False), name='notif_user_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.email}"
\ No newline at end of file
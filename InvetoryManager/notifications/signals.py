@@ -1,23 +1,34 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.auth import get_user_model
 from products.models import Product
+from products.signals import stock_transactions_created
+from .counters import adjust_unread_count, reset_unread_count
+from .dispatch import queue_low_stock
 from .models import Notification
 
-User = get_user_model()
-
 
 @receiver(post_save, sender=Product)
 def check_low_stock(sender, instance, **kwargs):
     if instance.quantity <= instance.min_stock and instance.min_stock > 0:
-        admins_managers = User.objects.filter(role__in=['admin', 'manager'])
-
-        for user in admins_managers:
-            Notification.objects.create(
-                user=user,
-                title='Низкий запас товара',
-                message=f'Товар "{instance.name}" (артикул: {instance.sku}) достиг минимального запаса. Текущий остаток: {instance.quantity}',
-                notification_type='low_stock',
-                related_object_id=instance.id,
-                related_object_type='product'
-            )
\ No newline at end of file
+        queue_low_stock([instance.pk])
+
+
+@receiver(stock_transactions_created)
+def check_low_stock_after_transactions(sender, transactions, **kwargs):
+    # Остаток проверяется при отправке пакета, после коммита
+    queue_low_stock(stock_transaction.product_id for stock_transaction in transactions)
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_count(sender, instance, created, **kwargs):
+    if created:
+        adjust_unread_count(instance.user_id, 0 if instance.is_read else 1)
+    else:
+        # Прежнее значение is_read неизвестно, счетчик будет пересчитан
+        reset_unread_count(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def update_unread_count_on_delete(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread_count(instance.user_id, -1)
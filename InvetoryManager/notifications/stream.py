@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from .counters import get_unread_count
+from .models import Notification
+
+# Как часто поток сверяет счетчик в кеше и как часто шлет пустой комментарий,
+# чтобы прокси не закрыли простаивающее соединение
+POLL_INTERVAL = 2
+HEARTBEAT_INTERVAL = 15
+# Соединение периодически закрывается, браузер переподключается сам через RETRY_MS
+STREAM_LIFETIME = 300
+RETRY_MS = 3000
+NEW_NOTIFICATIONS_LIMIT = 10
+
+
+def _event(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _latest_notification_id(user_id):
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _notifications_after(user_id, last_id):
+    return list(Notification.objects.filter(user_id=user_id, is_read=False, id__gt=last_id).order_by('id').values(
+        'id', 'title', 'message', 'notification_type', 'related_object_id', 'related_object_type'
+    )[:NEW_NOTIFICATIONS_LIMIT])
+
+
+async def unread_events(user_id, last_event_id=None):
+    """Server-Sent Events со счетчиком непрочитанных и новыми уведомлениями.
+
+    Поток читает только счетчик в кеше; к базе он обращается, лишь когда
+    счетчик вырос, чтобы забрать новые уведомления. Id последнего
+    отправленного уведомления уходит в поле id, поэтому после
+    переподключения браузер продолжает с того же места.
+    """
+    get_count = sync_to_async(get_unread_count)
+    last_id = last_event_id
+    if last_id is None:
+        last_id = await sync_to_async(_latest_notification_id)(user_id)
+
+    yield f'retry: {RETRY_MS}\n\n'
+
+    count = None
+    started = last_sent = time.monotonic()
+    while time.monotonic() - started < STREAM_LIFETIME:
+        current = await get_count(user_id)
+        if current != count:
+            if count is None or current > count:
+                for notification in await sync_to_async(_notifications_after)(user_id, last_id):
+                    last_id = notification['id']
+                    yield _event('notification', notification, event_id=last_id)
+            yield _event('unread_count', {'unread_count': current})
+            count = current
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= HEARTBEAT_INTERVAL:
+            yield ': ping\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(POLL_INTERVAL)
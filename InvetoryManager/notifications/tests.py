@@ -1,3 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from expenses.models import ExpenseInvoice, ExpenseInvoiceItem, ExpenseReason
+from products.ledger import apply_transactions
+from products.models import Product, StockTransaction
+from .models import Notification
 
-# Create your tests here.
+User = get_user_model()
+
+
+class LowStockFanOutTests(TestCase):
+    LINES = 500
+    # Проведение накладной вместе с рассылкой уведомлений занимает около
+    # 45 запросов при любом числе строк; запросы на строку дали бы сотни
+    MAX_QUERIES = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+        cls.manager = User.objects.create_user(email='manager@example.com', username='manager', password='password', role='manager')
+        cls.reason = ExpenseReason.objects.create(name='Списание')
+        Product.objects.bulk_create([
+            Product(name=f'Товар {index}', sku=f'G-{index:04d}', price=10, quantity=10, min_stock=5)
+            for index in range(cls.LINES)
+        ])
+        cls.products = list(Product.objects.order_by('pk'))
+
+    def create_invoice(self, quantity):
+        invoice = ExpenseInvoice.objects.create(expense_date=timezone.localdate(), reason=self.reason, created_by=self.admin)
+        invoice.add_items(ExpenseInvoiceItem(product_id=product.pk, quantity=quantity) for product in self.products)
+        return invoice
+
+    def complete(self, invoice):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('expenses:expense_invoice_complete', args=[invoice.pk]))
+        self.assertEqual(response.status_code, 302)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, 'completed')
+        return len(queries)
+
+    def test_large_invoice_sends_notifications_in_bounded_queries(self):
+        self.client.force_login(self.admin)
+
+        query_count = self.complete(self.create_invoice(quantity=6))
+
+        self.assertLessEqual(query_count, self.MAX_QUERIES)
+        self.assertEqual(Notification.objects.filter(notification_type='low_stock').count(), self.LINES * 2)
+
+    def test_product_already_low_is_not_notified_twice(self):
+        self.client.force_login(self.admin)
+        self.complete(self.create_invoice(quantity=6))
+
+        self.complete(self.create_invoice(quantity=1))
+
+        notifications = Notification.objects.filter(notification_type='low_stock')
+        self.assertEqual(notifications.count(), self.LINES * 2)
+        self.assertEqual(notifications.values('user_id', 'related_object_id').distinct().count(), self.LINES * 2)
+
+    def test_rolled_back_transaction_does_not_block_later_batches(self):
+        rolled_back, committed = self.products[:2]
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            apply_transactions([StockTransaction(product=rolled_back, transaction_type='out', quantity=6)], self.admin)
+            raise RuntimeError
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transactions([StockTransaction(product=committed, transaction_type='out', quantity=6)], self.admin)
+
+        notified = Notification.objects.filter(notification_type='low_stock').values_list('related_object_id', flat=True)
+        self.assertEqual(set(notified), {committed.pk})
@@ -8,4 +8,5 @@ urlpatterns = [
     path('<int:pk>/read/', views.mark_as_read, name='mark_read'),
     path('mark-all-read/', views.mark_all_as_read, name='mark_all_read'),
     path('unread-count/', views.get_unread_count, name='unread_count'),
+    path('stream/', views.unread_stream, name='stream'),
 ]
\ No newline at end of file
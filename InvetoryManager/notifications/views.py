@@ -1,7 +1,10 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from .models import Notification
+from .counters import get_unread_count as cached_unread_count, adjust_unread_count
+from .stream import unread_events
 from django.core.paginator import Paginator
 
 
@@ -11,7 +14,7 @@ def notification_list(request):
 
     if request.method == 'GET' and 'mark_read' in request.GET:
         unread_notifications = notifications.filter(is_read=False)
-        unread_notifications.update(is_read=True)
+        adjust_unread_count(request.user.pk, -unread_notifications.update(is_read=True))
 
     paginator = Paginator(notifications, 20)
     page_number = request.GET.get('page')
@@ -25,8 +28,8 @@ def notification_list(request):
 @login_required
 def mark_as_read(request, pk):
     notification = get_object_or_404(Notification, pk=pk, user=request.user)
-    notification.is_read = True
-    notification.save()
+    if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+        adjust_unread_count(request.user.pk, -1)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -36,7 +39,8 @@ def mark_as_read(request, pk):
 
 @login_required
 def mark_all_as_read(request):
-    Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    updated = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+    adjust_unread_count(request.user.pk, -updated)
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -46,5 +50,30 @@ def mark_all_as_read(request):
 
 @login_required
 def get_unread_count(request):
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'unread_count': count})
\ No newline at end of file
+    return JsonResponse({'unread_count': cached_unread_count(request.user.pk)})
+
+
+@login_required
+async def unread_stream(request):
+    """Поток Server-Sent Events для счетчика уведомлений.
+
+    Работает только под ASGI. Под WSGI поток занял бы рабочий процесс
+    целиком, поэтому отдается 204: EventSource после него не
+    переподключается, и страница переходит на опрос unread_count.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', ''))
+    except ValueError:
+        last_event_id = None
+
+    response = StreamingHttpResponse(
+        unread_events(user.pk, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
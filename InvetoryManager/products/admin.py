@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Product, StockTransaction, Category, Supplier, PurchaseInvoice, PurchaseInvoiceItem
+from .models import Product, StockTransaction, StockBatch, DocumentSequence, CostLayer, ProductValuation, Category, Supplier, PurchaseInvoice, PurchaseInvoiceItem
+from .search import search_products
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -13,12 +14,21 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ['name', 'sku', 'description']
     readonly_fields = ['created_at', 'updated_at']
 
+    def get_search_results(self, request, queryset, search_term):
+        return search_products(queryset, search_term), False
+
 @admin.register(StockTransaction)
 class StockTransactionAdmin(admin.ModelAdmin):
     list_display = ['product', 'transaction_type', 'quantity', 'date', 'user']
     list_filter = ['transaction_type', 'date']
     search_fields = ['product__name', 'user__email']
 
+@admin.register(StockBatch)
+class StockBatchAdmin(admin.ModelAdmin):
+    list_display = ['idempotency_key', 'user', 'created_at']
+    search_fields = ['idempotency_key', 'user__email']
+    readonly_fields = ['user', 'idempotency_key', 'request_hash', 'response', 'created_at']
+
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -32,6 +42,10 @@ class PurchaseInvoiceItemInline(admin.TabularInline):
     fields = ['product', 'quantity', 'purchase_price', 'total_price']
     readonly_fields = ['total_price']
 
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['prefix', 'last_value']
+
 @admin.register(PurchaseInvoice)
 class PurchaseInvoiceAdmin(admin.ModelAdmin):
     list_display = ['invoice_number', 'supplier', 'invoice_date', 'status', 'total_amount', 'created_by']
@@ -55,4 +69,17 @@ class PurchaseInvoiceAdmin(admin.ModelAdmin):
 class PurchaseInvoiceItemAdmin(admin.ModelAdmin):
     list_display = ['invoice', 'product', 'quantity', 'purchase_price', 'total_price']
     list_filter = ['invoice__supplier', 'invoice__invoice_date']
-    search_fields = ['product__name', 'invoice__invoice_number']
\ No newline at end of file
+    search_fields = ['product__name', 'invoice__invoice_number']
+
+@admin.register(ProductValuation)
+class ProductValuationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'quantity', 'fifo_value', 'average_value', 'updated_at']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['product', 'quantity', 'fifo_value', 'average_value', 'updated_at']
+
+@admin.register(CostLayer)
+class CostLayerAdmin(admin.ModelAdmin):
+    list_display = ['product', 'received_at', 'quantity', 'remaining', 'unit_cost']
+    list_filter = ['received_at']
+    search_fields = ['product__name', 'product__sku']
+    readonly_fields = ['product', 'stock_transaction', 'received_at', 'quantity', 'remaining', 'unit_cost']
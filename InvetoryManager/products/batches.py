@@ -0,0 +1,168 @@
+import hashlib
+import json
+from django.db import IntegrityError, transaction
+from .ledger import apply_transactions, InsufficientStock
+from .models import Product, StockTransaction, StockBatch
+
+MAX_BATCH_LINES = 1000
+MAX_KEY_LENGTH = 255
+
+
+class BatchResult:
+    def __init__(self, status_code, body, replayed=False):
+        self.status_code = status_code
+        self.body = body
+        self.replayed = replayed
+
+
+def _error(status_code, message, results=None):
+    body = {'status': 'error', 'error': message}
+    if results is not None:
+        body['results'] = results
+    return BatchResult(status_code, body)
+
+
+def _request_hash(items):
+    return hashlib.sha256(json.dumps(items, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def _validate_line(line):
+    if not isinstance(line, dict):
+        return ['строка должна быть объектом']
+
+    errors = []
+    sku = line.get('sku')
+    if not isinstance(sku, str) or not sku.strip():
+        errors.append('не указан артикул (sku)')
+    if line.get('type') not in ('in', 'out'):
+        errors.append('тип операции (type) должен быть "in" или "out"')
+    quantity = line.get('quantity')
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+        errors.append('количество (quantity) должно быть целым положительным числом')
+    if not isinstance(line.get('comment', ''), str):
+        errors.append('комментарий (comment) должен быть строкой')
+    return errors
+
+
+def _insufficient_lines(items, product_ids):
+    """Номера строк по товарам, которым не хватило остатка, с текущим остатком"""
+    deltas = {}
+    for index, line in enumerate(items):
+        sign = 1 if line['type'] == 'in' else -1
+        product_id = product_ids[line['sku'].strip()]
+        deltas[product_id] = deltas.get(product_id, 0) + sign * line['quantity']
+
+    short = {
+        pk: quantity
+        for pk, quantity in Product.objects.filter(
+            pk__in=[pk for pk, delta in deltas.items() if delta < 0]
+        ).values_list('pk', 'quantity')
+        if quantity + deltas[pk] < 0
+    }
+    return {
+        index: short[product_ids[line['sku'].strip()]]
+        for index, line in enumerate(items)
+        if line['type'] == 'out' and product_ids[line['sku'].strip()] in short
+    }
+
+
+def _replay(batch, request_hash):
+    if batch.request_hash != request_hash:
+        return _error(422, 'Ключ идемпотентности уже использован для другого пакета')
+    return BatchResult(200, batch.response, replayed=True)
+
+
+def process_stock_batch(user, payload, idempotency_key=''):
+    """Проведение пакета операций по складу.
+
+    payload — {"items": [{"sku", "type", "quantity", "comment"}, ...]}.
+    Артикулы разрешаются одним запросом, пакет проводится целиком через
+    ledger или не проводится вовсе; в ответе результат по каждой строке.
+
+    Если передан ключ идемпотентности, ответ проведенного пакета
+    сохраняется, и повтор с тем же ключом и теми же строками возвращает его
+    без повторного проведения. Ключ занимается в той же транзакции, что и
+    операции, поэтому параллельные повторы не проводят пакет дважды.
+    """
+    items = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return _error(400, 'Ожидается объект с непустым списком items')
+    if len(items) > MAX_BATCH_LINES:
+        return _error(400, f'Не больше {MAX_BATCH_LINES} строк в одном пакете')
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        return _error(400, f'Ключ идемпотентности длиннее {MAX_KEY_LENGTH} символов')
+
+    request_hash = _request_hash(items)
+    if idempotency_key:
+        batch = StockBatch.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if batch is not None:
+            return _replay(batch, request_hash)
+
+    line_errors = [_validate_line(line) for line in items]
+    skus = {line['sku'].strip() for line, errors in zip(items, line_errors) if not errors}
+    product_ids = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'pk'))
+    for line, errors in zip(items, line_errors):
+        if not errors and line['sku'].strip() not in product_ids:
+            errors.append(f'товар с артикулом "{line["sku"].strip()}" не найден')
+
+    if any(line_errors):
+        return _error(400, 'Пакет не проведен: ошибки в строках', [
+            {'line': index, 'status': 'error' if errors else 'skipped', 'errors': errors}
+            for index, errors in enumerate(line_errors, start=1)
+        ])
+
+    transactions = [
+        StockTransaction(
+            product_id=product_ids[line['sku'].strip()],
+            transaction_type=line['type'],
+            quantity=line['quantity'],
+            comment=line.get('comment', '')
+        )
+        for line in items
+    ]
+
+    try:
+        with transaction.atomic():
+            batch = None
+            if idempotency_key:
+                batch = StockBatch.objects.create(
+                    user=user, idempotency_key=idempotency_key, request_hash=request_hash, response={}
+                )
+
+            created = apply_transactions(transactions, user)
+            quantities = dict(Product.objects.filter(pk__in=product_ids.values()).values_list('pk', 'quantity'))
+            body = {
+                'status': 'ok',
+                'results': [
+                    {
+                        'line': index,
+                        'sku': line['sku'].strip(),
+                        'status': 'ok',
+                        'transaction_id': stock_transaction.pk,
+                        'quantity': quantities[stock_transaction.product_id],
+                    }
+                    for index, (line, stock_transaction) in enumerate(zip(items, created), start=1)
+                ],
+            }
+
+            if batch is not None:
+                batch.response = body
+                batch.save(update_fields=['response'])
+    except IntegrityError:
+        # Тот же ключ успел занять параллельный запрос
+        batch = StockBatch.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if batch is None:
+            raise
+        return _replay(batch, request_hash)
+    except InsufficientStock:
+        short = _insufficient_lines(items, product_ids)
+        return _error(409, 'Пакет не проведен: недостаточно товара на складе', [
+            {
+                'line': index + 1,
+                'status': 'error' if index in short else 'skipped',
+                'errors': [f'недостаточно товара на складе, остаток {short[index]}'] if index in short else [],
+            }
+            for index in range(len(items))
+        ])
+
+    return BatchResult(200, body)
@@ -1,6 +1,7 @@
 from django import forms
 from .models import Product, StockTransaction, Category,Supplier, PurchaseInvoice, PurchaseInvoiceItem
 from django.forms import inlineformset_factory
+from .widgets import ProductLookupSelect
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -18,6 +19,13 @@ class ProductForm(forms.ModelForm):
             'image': forms.FileInput(attrs={'class': 'form-control'}),
         }
 
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Файл CSV или XLSX',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+
+
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
@@ -55,7 +63,7 @@ class PurchaseInvoiceForm(forms.ModelForm):
         model = PurchaseInvoice
         fields = ['invoice_number', 'supplier', 'invoice_date', 'comment']
         widgets = {
-            'invoice_number': forms.TextInput(attrs={'class': 'form-control'}),
+            'invoice_number': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Присваивается при сохранении'}),
             'supplier': forms.Select(attrs={'class': 'form-control'}),
             'invoice_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'comment': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
@@ -66,7 +74,7 @@ class PurchaseInvoiceItemForm(forms.ModelForm):
         model = PurchaseInvoiceItem
         fields = ['product', 'quantity', 'purchase_price']
         widgets = {
-            'product': forms.Select(attrs={'class': 'form-control product-select'}),
+            'product': ProductLookupSelect(attrs={'class': 'form-control product-select'}),
             'quantity': forms.NumberInput(attrs={'class': 'form-control quantity'}),
             'purchase_price': forms.NumberInput(attrs={'class': 'form-control price', 'step': '0.01'}),
         }
@@ -0,0 +1,91 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction, close_old_connections
+from PIL import Image
+
+# Размеры производных изображений: (ширина, высота) вписываются с сохранением пропорций.
+# Варианты *_2x отдаются экранам с высокой плотностью пикселей через srcset.
+DERIVATIVE_SIZES = {
+    'list': (48, 48),
+    'list_2x': (96, 96),
+    'detail': (128, 128),
+    'detail_2x': (256, 256),
+}
+DERIVATIVE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+DERIVATIVE_DIR = 'products/derived'
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+            thread_name_prefix='product-image'
+        )
+    return _executor
+
+
+def schedule_derivatives(product_id, image_name):
+    """Генерация производных изображений в фоне после коммита транзакции"""
+    if getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2) > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, product_id, image_name))
+    else:
+        transaction.on_commit(lambda: build_derivatives(product_id, image_name))
+
+
+def _run_in_thread(product_id, image_name):
+    close_old_connections()
+    try:
+        build_derivatives(product_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def _encode(image, size, fmt):
+    derivative = image.copy()
+    derivative.thumbnail(size, Image.Resampling.LANCZOS)
+    if fmt == 'JPEG' and derivative.mode != 'RGB':
+        derivative = derivative.convert('RGB')
+    buffer = io.BytesIO()
+    derivative.save(buffer, fmt, quality=85)
+    return buffer.getvalue()
+
+
+def build_derivatives(product_id, image_name):
+    """Создание уменьшенных копий рядом с оригиналом.
+
+    Имена файлов строятся из хеша содержимого оригинала, поэтому их можно
+    кешировать бессрочно, а повторная обработка того же файла ничего не
+    пересчитывает. Оригинал не изменяется.
+    """
+    from .models import Product
+
+    with default_storage.open(image_name, 'rb') as original:
+        content = original.read()
+    digest = hashlib.sha256(content).hexdigest()[:16]
+
+    variants = {}
+    image = None
+    for label, size in DERIVATIVE_SIZES.items():
+        variants[label] = {}
+        for ext, fmt in DERIVATIVE_FORMATS.items():
+            name = f'{DERIVATIVE_DIR}/{digest}_{label}.{ext}'
+            if not default_storage.exists(name):
+                if image is None:
+                    image = Image.open(io.BytesIO(content))
+                    image.load()
+                name = default_storage.save(name, ContentFile(_encode(image, size, fmt)))
+            variants[label][ext] = name
+
+    # Если за время обработки загрузили другое фото, результат устарел
+    Product.objects.filter(pk=product_id, image=image_name).update(image_variants=variants)
+    return variants
@@ -0,0 +1,275 @@
+import csv
+import io
+import os
+from decimal import Decimal, InvalidOperation
+import openpyxl
+from django.db import transaction
+from users import dashboard, view_cache
+from .ledger import apply_transactions
+from .models import Product, Category, StockTransaction
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+# Названия колонок: ключи и заголовки выгрузки «Остатки товаров», чтобы
+# выгруженный отчет можно было загрузить обратно
+COLUMNS = {
+    'sku': ['sku', 'артикул', 'артикул (sku)'],
+    'name': ['name', 'наименование', 'название'],
+    'category': ['category', 'категория'],
+    'unit': ['unit', 'ед. изм.', 'единица измерения'],
+    'price': ['price', 'цена', 'цена за единицу'],
+    'quantity': ['quantity', 'текущий остаток', 'остаток'],
+    'min_stock': ['min_stock', 'мин. запас', 'минимальный запас'],
+    'description': ['description', 'описание'],
+}
+REQUIRED_COLUMNS = ['sku', 'name', 'price']
+
+UNITS = {}
+for value, label in Product.UNIT_CHOICES:
+    UNITS[value.lower()] = value
+    UNITS[label.lower()] = value
+
+
+class CatalogImportError(Exception):
+    """Файл нельзя разобрать: неизвестный формат или нет обязательных колонок"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _xlsx_rows(fileobj):
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Строки файла по одной, без загрузки всего файла в память"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return _csv_rows(fileobj)
+    if extension in ('.xlsx', '.xlsm'):
+        return _xlsx_rows(fileobj)
+    raise CatalogImportError('Поддерживаются файлы CSV и XLSX')
+
+
+def _column_map(header):
+    aliases = {alias: field for field, names in COLUMNS.items() for alias in names}
+    columns = {}
+    for index, title in enumerate(header):
+        field = aliases.get(str(title or '').strip().lower())
+        if field and field not in columns:
+            columns[field] = index
+
+    missing = [field for field in REQUIRED_COLUMNS if field not in columns]
+    if missing:
+        raise CatalogImportError(f'В файле нет обязательных колонок: {", ".join(missing)}')
+    return columns
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _non_negative_int(value, label):
+    text = _text(value)
+    if not text:
+        return 0
+    try:
+        number = Decimal(text.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f'{label}: "{text}" не число')
+    if number < 0 or number != number.to_integral_value():
+        raise ValueError(f'{label}: нужно целое неотрицательное число')
+    return int(number)
+
+
+def parse_row(values, columns):
+    """Поля товара из строки файла; ValueError с описанием ошибки"""
+    def cell(field):
+        index = columns.get(field)
+        return values[index] if index is not None and index < len(values) else None
+
+    sku = _text(cell('sku'))
+    name = _text(cell('name'))
+    if not sku:
+        raise ValueError('не указан артикул')
+    if len(sku) > 100:
+        raise ValueError('артикул длиннее 100 символов')
+    if not name:
+        raise ValueError('не указано название')
+    if len(name) > 255:
+        raise ValueError('название длиннее 255 символов')
+
+    price_text = _text(cell('price')).replace(',', '.').replace(' ', '')
+    try:
+        price = Decimal(price_text).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'цена: "{price_text}" не число')
+    if price < 0 or price >= Decimal('100000000'):
+        raise ValueError('цена вне допустимого диапазона')
+
+    row = {'sku': sku, 'name': name, 'price': price}
+
+    if 'unit' in columns:
+        unit_text = _text(cell('unit'))
+        unit = UNITS.get(unit_text.lower()) if unit_text else 'шт'
+        if unit is None:
+            raise ValueError(f'неизвестная единица измерения "{unit_text}"')
+        row['unit'] = unit
+    if 'quantity' in columns:
+        row['quantity'] = _non_negative_int(cell('quantity'), 'остаток')
+    if 'min_stock' in columns:
+        row['min_stock'] = _non_negative_int(cell('min_stock'), 'минимальный запас')
+    if 'description' in columns:
+        row['description'] = _text(cell('description'))
+    if 'category' in columns:
+        category = _text(cell('category'))
+        if len(category) > 255:
+            raise ValueError('название категории длиннее 255 символов')
+        row['category'] = category
+    return row
+
+
+class CategoryLookup:
+    """Id категорий по названию; недостающие категории создаются при первом обращении"""
+
+    def __init__(self):
+        self.ids = {}
+        for pk, name in Category.objects.order_by('-pk').values_list('pk', 'name'):
+            self.ids[name.lower()] = pk
+
+    def __call__(self, name):
+        if not name:
+            return None
+        key = name.lower()
+        if key not in self.ids:
+            self.ids[key] = Category.objects.create(name=name).pk
+        return self.ids[key]
+
+
+def _post_quantity_changes(rows, user):
+    """Разница с остатком в файле проводится операциями, чтобы она попала в
+    историю движения, дневные итоги и остатки на дату"""
+    current = Product.objects.select_for_update().filter(sku__in=rows).values_list('pk', 'sku', 'quantity')
+    transactions = []
+    for pk, sku, quantity in current.order_by('pk'):
+        delta = rows[sku]['quantity'] - quantity
+        if delta:
+            transactions.append(StockTransaction(
+                product_id=pk,
+                transaction_type='in' if delta > 0 else 'out',
+                quantity=abs(delta),
+                comment='Импорт каталога',
+            ))
+    if transactions:
+        apply_transactions(transactions, user)
+
+
+def _upsert(chunk, fields, categories, user, result):
+    # В одном INSERT ... ON CONFLICT артикул должен встречаться один раз
+    rows = {row['sku']: row for row in chunk}
+    # Категории создаются до транзакции порции: откат порции не должен
+    # оставить в кеше id несуществующих категорий
+    category_ids = {row['category']: categories(row['category']) for row in rows.values()} if 'category' in fields else {}
+
+    with transaction.atomic():
+        existing = set(Product.objects.filter(sku__in=rows).values_list('sku', flat=True))
+        if 'quantity' in fields and existing:
+            _post_quantity_changes({sku: rows[sku] for sku in existing}, user)
+
+        products = []
+        for row in rows.values():
+            product = Product(created_by=user)
+            for field in fields:
+                if field == 'category':
+                    product.category_id = category_ids[row['category']]
+                else:
+                    setattr(product, field, row[field])
+            products.append(product)
+
+        # Остаток задается только новым товарам, у существующих он уже
+        # изменен операциями
+        update_fields = ['updated_at', *fields]
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=[field for field in update_fields if field not in ('sku', 'quantity')],
+        )
+
+    result.updated += len(existing)
+    result.created += len(rows) - len(existing)
+
+
+def import_products(rows, user=None, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Загрузка каталога с обновлением товаров по артикулу.
+
+    rows — итератор строк, первая строка — заголовок. Строки проверяются и
+    записываются порциями по chunk_size одним INSERT ... ON CONFLICT (sku)
+    DO UPDATE, каждая порция в своей транзакции. Обновляются только колонки,
+    которые есть в файле. Строки с ошибками пропускаются и попадают в
+    result.errors с номером строки файла.
+
+    Запись идет в обход save() и post_save: фото не обрабатываются,
+    уведомления о низком запасе не рассылаются. Изменение остатка
+    существующих товаров проводится операциями прихода или расхода.
+    Счетчики главной страницы и кеш страниц сбрасываются после загрузки.
+    """
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise CatalogImportError('Файл пуст')
+    columns = _column_map(header)
+    fields = [field for field in COLUMNS if field in columns]
+
+    result = ImportResult()
+    categories = CategoryLookup()
+    chunk = []
+    for row_number, values in enumerate(rows, start=2):
+        if not any(_text(value) for value in values):
+            continue
+        try:
+            chunk.append(parse_row(values, columns))
+        except ValueError as e:
+            result.add_error(row_number, str(e))
+        if len(chunk) >= chunk_size:
+            _upsert(chunk, fields, categories, user, result)
+            chunk = []
+            if progress:
+                progress(result)
+    if chunk:
+        _upsert(chunk, fields, categories, user, result)
+
+    dashboard.invalidate('products_count', 'low_stock_count', 'recent_transactions')
+    view_cache.invalidate('products', 'categories')
+    return result
@@ -0,0 +1,105 @@
+from collections import defaultdict
+from django.db import connection, transaction
+from django.utils import timezone
+from . import valuation
+from .models import Product, StockTransaction
+from .signals import stock_transactions_created
+
+# Сколько раз повторяется UPDATE, если нехватка, из-за которой он не прошел,
+# к повторному чтению уже исчезла
+UPDATE_ATTEMPTS = 3
+
+
+class InsufficientStock(Exception):
+    """Расход больше текущего остатка товара"""
+
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f'Недостаточно товара "{product.name}" на складе')
+
+
+def _stock_deltas(transactions):
+    deltas = defaultdict(int)
+    for stock_transaction in transactions:
+        if stock_transaction.transaction_type == 'in':
+            deltas[stock_transaction.product_id] += stock_transaction.quantity
+        else:
+            deltas[stock_transaction.product_id] -= stock_transaction.quantity
+    return deltas
+
+
+def _find_insufficient(deltas):
+    """Товар, которому не хватает остатка; None, если при повторном чтении нехватки уже нет"""
+    products = list(Product.objects.filter(pk__in=list(deltas)).order_by('pk').only('id', 'name', 'quantity'))
+    for product in products:
+        if product.quantity + deltas[product.pk] < 0:
+            return product
+    if len(products) != len(deltas):
+        raise Product.DoesNotExist('Товар операции удален')
+    return None
+
+
+def _update_quantities(deltas, now):
+    """Один UPDATE на все товары, отправленный через executemany.
+
+    Условие quantity + delta >= 0 проверяется внутри UPDATE, поэтому между
+    чтением и записью остатка нет окна для гонки. Возвращает число
+    обновленных строк.
+    """
+    sql = 'UPDATE {table} SET {quantity} = {quantity} + %s, {updated_at} = %s WHERE {id} = %s AND {quantity} + %s >= 0'.format(
+        table=connection.ops.quote_name(Product._meta.db_table),
+        quantity=connection.ops.quote_name('quantity'),
+        updated_at=connection.ops.quote_name('updated_at'),
+        id=connection.ops.quote_name('id'),
+    )
+    now = connection.ops.adapt_datetimefield_value(now)
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(delta, now, pk, delta) for pk, delta in sorted(deltas.items())])
+        return cursor.rowcount
+
+
+def apply_transactions(transactions, user):
+    """Проведение операций по складу.
+
+    Изменения остатков сводятся по товарам и применяются одним
+    UPDATE ... SET quantity = quantity + %s с условием, что новый остаток
+    не отрицателен, поэтому параллельные операции не теряют обновления и не
+    уводят остаток в минус. Товары обновляются в порядке id, что исключает
+    взаимные блокировки. Операции записываются одним bulk_create, в той же
+    транзакции приходы становятся партиями, а расходы списывают партии
+    (products/valuation.py). Если хотя бы одному товару не хватило остатка,
+    все изменения откатываются и выбрасывается InsufficientStock. Если
+    нехватку к повторному чтению сняла параллельная операция, UPDATE
+    повторяется до UPDATE_ATTEMPTS раз.
+    """
+    transactions = list(transactions)
+    deltas = _stock_deltas(transactions)
+
+    with transaction.atomic():
+        for attempt in range(UPDATE_ATTEMPTS if deltas else 0):
+            savepoint = transaction.savepoint()
+            if _update_quantities(deltas, timezone.now()) == len(deltas):
+                transaction.savepoint_commit(savepoint)
+                break
+            # Часть товаров уже списана: товар с нехваткой ищется по
+            # остаткам до UPDATE
+            transaction.savepoint_rollback(savepoint)
+            short = _find_insufficient(deltas)
+            if short is not None:
+                raise InsufficientStock(short)
+            # Нехватку сняла параллельная операция между UPDATE и чтением
+        else:
+            if deltas:
+                raise InsufficientStock(min(
+                    Product.objects.filter(pk__in=[pk for pk, delta in deltas.items() if delta < 0]).only('id', 'name'),
+                    key=lambda product: product.pk,
+                ))
+
+        for stock_transaction in transactions:
+            stock_transaction.user = user
+        valuation.price_receipts(transactions)
+        created = StockTransaction.objects.bulk_create(transactions)
+        valuation.post_transactions(created)
+        stock_transactions_created.send(sender=StockTransaction, transactions=created)
+
+    return created
@@ -0,0 +1,81 @@
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from products.ledger import apply_transactions
+from products.models import Product, StockTransaction
+
+
+class Command(BaseCommand):
+    help = ('Замер пропускной способности проведения операций из параллельных потоков: операций в секунду, '
+            'задержка и ошибки. Работает с текущей базой (SQLite или PostgreSQL из DATABASE_URL); '
+            'потоки пишут в отдельных транзакциях, поэтому тестовые данные удаляются после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8], help='Число потоков, по замеру на каждое значение')
+        parser.add_argument('--operations', type=int, default=200, help='Операций на поток')
+        parser.add_argument('--products', type=int, default=4, help='Число товаров: чем меньше, тем больше конфликтов за строки')
+
+    def handle(self, *args, **options):
+        if min(options['threads']) < 1 or options['operations'] < 1 or options['products'] < 1:
+            raise CommandError('Число потоков, операций и товаров должно быть больше 0')
+
+        self.stdout.write(f'База: {connection.vendor}')
+        user = get_user_model().objects.create_user(
+            email='benchmark@example.com', username='benchmark-concurrency', password=None
+        )
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {index}', sku=f'BENCH-{index:06d}', price=10, quantity=0)
+            for index in range(options['products'])
+        ])
+        try:
+            self.stdout.write(f'{"потоков":>8} {"операций":>9} {"оп/с":>9} {"p50":>9} {"p95":>9} {"ошибок":>7}')
+            for threads in options['threads']:
+                self._report(threads, options['operations'], products, user)
+        finally:
+            # Операции, партии и итоги удаляются каскадом вместе с товарами
+            Product.objects.filter(pk__in=[product.pk for product in products]).delete()
+            user.delete()
+
+    def _report(self, threads, operations, products, user):
+        barrier = threading.Barrier(threads)
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(index):
+            timings = []
+            try:
+                barrier.wait()
+                for step in range(operations):
+                    product = products[(index + step) % len(products)]
+                    started = time.perf_counter()
+                    try:
+                        apply_transactions([StockTransaction(product=product, transaction_type='in', quantity=1)], user)
+                    except Exception as e:
+                        with lock:
+                            errors.append(e)
+                        continue
+                    timings.append(time.perf_counter() - started)
+            finally:
+                with lock:
+                    latencies.extend(timings)
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+        self.stdout.write(
+            f'{threads:>8} {len(latencies):>9} {len(latencies) / elapsed:>9.0f} '
+            f'{p50:>6.1f} мс {p95:>6.1f} мс {len(errors):>7}'
+        )
+        if errors:
+            self.stdout.write(f'Первая ошибка: {errors[0]}')
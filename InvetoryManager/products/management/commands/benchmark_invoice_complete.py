@@ -0,0 +1,75 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from expenses.models import ExpenseInvoice, ExpenseInvoiceItem, ExpenseReason
+from products.models import Product, PurchaseInvoice, PurchaseInvoiceItem, Supplier
+
+
+class Command(BaseCommand):
+    help = ('Замер проведения накладных прихода и расхода: число запросов и время POST на завершение. '
+            'Тестовые данные создаются в транзакции, которая откатывается после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 100, 2000],
+                            help='Число строк в накладных, по замеру на каждое значение')
+
+    def handle(self, *args, **options):
+        sizes = options['lines']
+        if min(sizes) < 1:
+            raise CommandError('Число строк должно быть больше 0')
+
+        with transaction.atomic():
+            self._create_data(max(sizes))
+            self.stdout.write(f'{"":18} {"строк":>6} {"запросов":>9} {"время":>12}')
+            for lines in sizes:
+                self._report('Приход', lines, self._purchase(lines), 'products:purchase_invoice_complete')
+                self._report('Расход', lines, self._expense(lines), 'expenses:expense_invoice_complete')
+            transaction.set_rollback(True)
+
+    def _create_data(self, lines):
+        self.user = get_user_model().objects.create_user(
+            email='benchmark@example.com', username='benchmark-complete', password=None, role='admin'
+        )
+        self.supplier = Supplier.objects.create(name='Поставщик для замера')
+        self.reason = ExpenseReason.objects.create(name='Списание для замера')
+        self.product_ids = [
+            product.pk for product in Product.objects.bulk_create([
+                Product(name=f'Товар {index}', sku=f'BENCH-{index:06d}', price=10, quantity=0)
+                for index in range(lines)
+            ])
+        ]
+        # DEBUG-настройки без ALLOWED_HOSTS пропускают только localhost
+        self.client = Client(HTTP_HOST='localhost')
+        self.client.force_login(self.user)
+
+    def _purchase(self, lines):
+        invoice = PurchaseInvoice.objects.create(
+            supplier=self.supplier, invoice_date=timezone.localdate(), created_by=self.user
+        )
+        invoice.add_items([
+            PurchaseInvoiceItem(product_id=product_id, quantity=2, purchase_price=5)
+            for product_id in self.product_ids[:lines]
+        ])
+        return invoice
+
+    def _expense(self, lines):
+        invoice = ExpenseInvoice.objects.create(
+            expense_date=timezone.localdate(), reason=self.reason, created_by=self.user
+        )
+        invoice.add_items([ExpenseInvoiceItem(product_id=product_id, quantity=1) for product_id in self.product_ids[:lines]])
+        return invoice
+
+    def _report(self, name, lines, invoice, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            self.client.post(reverse(url_name, args=[invoice.pk]))
+            elapsed = time.perf_counter() - started
+        invoice.refresh_from_db(fields=['status'])
+        if invoice.status != 'completed':
+            raise CommandError(f'{name}: накладная на {lines} строк не проведена')
+        self.stdout.write(f'{name:18} {lines:>6} {len(queries):>9} {elapsed * 1000:>9.1f} мс')
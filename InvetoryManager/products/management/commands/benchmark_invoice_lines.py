@@ -0,0 +1,75 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from expenses.models import ExpenseInvoice, ExpenseInvoiceItem, ExpenseReason
+from products.models import Product, PurchaseInvoice, PurchaseInvoiceItem, Supplier
+
+
+class Command(BaseCommand):
+    help = ('Замер записи строк накладных: построчный save() против add_items. '
+            'Тестовые данные создаются в транзакции, которая откатывается после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=1000, help='Число строк в накладной')
+
+    def handle(self, *args, **options):
+        lines = options['lines']
+        if lines < 1:
+            raise CommandError('Число строк должно быть больше 0')
+
+        with transaction.atomic():
+            self._create_data(lines)
+            self.stdout.write(f'{"":26} {"запросов":>9} {"время":>12}')
+            self._report('Приход, построчный save()', self._purchase, per_line=True)
+            self._report('Приход, add_items', self._purchase, per_line=False)
+            self._report('Расход, построчный save()', self._expense, per_line=True)
+            self._report('Расход, add_items', self._expense, per_line=False)
+            transaction.set_rollback(True)
+
+    def _create_data(self, lines):
+        self.user = get_user_model().objects.create_user(
+            email='benchmark@example.com', username='benchmark-invoice', password=None
+        )
+        self.supplier = Supplier.objects.create(name='Поставщик для замера')
+        self.reason = ExpenseReason.objects.create(name='Списание для замера')
+        self.product_ids = [
+            product.pk for product in Product.objects.bulk_create([
+                Product(name=f'Товар {index}', sku=f'BENCH-{index:06d}', price=10, quantity=0)
+                for index in range(lines)
+            ])
+        ]
+
+    def _report(self, name, write, per_line):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            write(per_line)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{name:26} {len(queries):>9} {elapsed * 1000:>9.1f} мс')
+
+    def _purchase(self, per_line):
+        invoice = PurchaseInvoice.objects.create(
+            supplier=self.supplier, invoice_date=timezone.localdate(), created_by=self.user
+        )
+        items = [
+            PurchaseInvoiceItem(product_id=product_id, quantity=2, purchase_price=5)
+            for product_id in self.product_ids
+        ]
+        self._write(invoice, items, per_line)
+
+    def _expense(self, per_line):
+        invoice = ExpenseInvoice.objects.create(
+            expense_date=timezone.localdate(), reason=self.reason, created_by=self.user
+        )
+        items = [ExpenseInvoiceItem(product_id=product_id, quantity=2) for product_id in self.product_ids]
+        self._write(invoice, items, per_line)
+
+    def _write(self, invoice, items, per_line):
+        if not per_line:
+            invoice.add_items(items)
+            return
+        for item in items:
+            item.invoice = invoice
+            item.save()
@@ -0,0 +1,83 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+from products.models import Product, StockTransaction
+from products.pagination import approximate_count, encode_cursor, keyset_paginate
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Замер истории операций: первая и дальняя страница с OFFSET и COUNT(*) против курсора по (date, id). '
+            'Тестовые операции создаются в транзакции, которая откатывается после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page', type=int, default=10000, help='Номер дальней страницы')
+        parser.add_argument('--per-page', type=int, default=20, help='Строк на странице')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов замера; выводится лучшее время')
+
+    def handle(self, *args, **options):
+        page, per_page = options['page'], options['per_page']
+        if page < 1 or per_page < 1 or options['repeat'] < 1:
+            raise CommandError('Номер страницы, размер страницы и число повторов должны быть больше 0')
+
+        with transaction.atomic():
+            self._create_data(page * per_page)
+            transactions = StockTransaction.objects.select_related('product', 'user')
+            self._report(transactions, page, per_page, options['repeat'])
+            transaction.set_rollback(True)
+
+    def _create_data(self, rows):
+        user = get_user_model().objects.create_user(
+            email='benchmark@example.com', username='benchmark-pagination', password=None
+        )
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {index}', sku=f'BENCH-{index:06d}', price=10, quantity=0)
+            for index in range(100)
+        ])
+        for offset in range(0, rows, BATCH_SIZE):
+            StockTransaction.objects.bulk_create([
+                StockTransaction(
+                    product=products[index % len(products)],
+                    transaction_type='in' if index % 2 else 'out',
+                    quantity=1,
+                    user=user,
+                )
+                for index in range(offset, min(offset + BATCH_SIZE, rows))
+            ])
+        self.stdout.write(f'Создано операций: {rows}')
+
+    def _best(self, repeat, measure):
+        timings = []
+        for attempt in range(repeat):
+            started = time.perf_counter()
+            measure()
+            timings.append(time.perf_counter() - started)
+        return min(timings) * 1000
+
+    def _report(self, transactions, page, per_page, repeat):
+        ordered = transactions.order_by('-date', '-id')
+
+        def offset_page(number):
+            # Прежняя схема: Paginator считает COUNT(*) и читает страницу через OFFSET
+            return lambda: list(Paginator(ordered, per_page).page(number).object_list)
+
+        def keyset_page(cursor):
+            def measure():
+                list(keyset_paginate(transactions, cursor, per_page))
+                approximate_count(transactions)
+            return measure
+
+        # Курсор дальней страницы указывает на последнюю строку предыдущей
+        previous_row = ordered[(page - 1) * per_page - 1] if page > 1 else None
+        deep_cursor = encode_cursor(previous_row, 'next') if previous_row else None
+
+        rows = [
+            ('OFFSET + COUNT(*)', self._best(repeat, offset_page(1)), self._best(repeat, offset_page(page))),
+            ('Курсор (date, id)', self._best(repeat, keyset_page(None)), self._best(repeat, keyset_page(deep_cursor))),
+        ]
+        self.stdout.write(f'{"":20} {"страница 1":>12} {f"страница {page}":>16}')
+        for name, first, deep in rows:
+            self.stdout.write(f'{name:20} {first:>9.2f} мс {deep:>13.2f} мс')
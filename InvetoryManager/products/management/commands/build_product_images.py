@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from products.images import build_derivatives
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий фото товаров, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Пересоздать копии для всех товаров с фото')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            products = products.filter(image_variants={})
+
+        processed = 0
+        for product_id, image_name in products.values_list('id', 'image').iterator():
+            try:
+                build_derivatives(product_id, image_name)
+                processed += 1
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'Товар {product_id}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано товаров: {processed}'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.imports import import_products, read_rows, CatalogImportError, IMPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Загрузка каталога товаров из CSV или XLSX с обновлением по артикулу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Строк в одной порции записи')
+
+    def handle(self, *args, **options):
+        def progress(result):
+            self.stdout.write(f'Записано: {result.created + result.updated}, ошибок: {result.error_count}')
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = import_products(
+                    read_rows(fileobj, options['path']),
+                    chunk_size=options['chunk_size'],
+                    progress=progress if options['verbosity'] > 1 else None
+                )
+        except (OSError, CatalogImportError) as e:
+            raise CommandError(str(e))
+
+        for row_number, message in result.errors:
+            self.stderr.write(f'Строка {row_number}: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... и еще {result.error_count - len(result.errors)} строк с ошибками')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {result.created}, обновлено: {result.updated}, ошибок: {result.error_count}'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from products.search import rebuild_search_index, search_supported
+
+
+class Command(BaseCommand):
+    help = 'Перестроение полнотекстового индекса товаров'
+
+    def handle(self, *args, **options):
+        if not search_supported():
+            self.stdout.write(self.style.WARNING(
+                f'Полнотекстовый индекс для {connection.vendor} не поддерживается, используется поиск по подстроке'
+            ))
+            return
+
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска товаров перестроен'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.valuation_rebuild import rebuild_valuation, check_valuation
+
+FIELD_LABELS = {
+    'quantity': 'количество',
+    'fifo_value': 'стоимость FIFO',
+    'average_value': 'стоимость по средней',
+}
+
+
+class Command(BaseCommand):
+    help = 'Пересчет партий и себестоимости остатков по истории операций склада'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сравнить текущую оценку с пересчетом, ничего не записывая')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = rebuild_valuation()
+            self.stdout.write(self.style.SUCCESS(f'Пересчитана оценка товаров: {count}'))
+            return
+
+        mismatches = check_valuation()
+        for product_id, field, current, expected in mismatches:
+            self.stderr.write(f'Товар {product_id}: {FIELD_LABELS[field]} {current}, по истории {expected}')
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Оценка совпадает с историей операций'))
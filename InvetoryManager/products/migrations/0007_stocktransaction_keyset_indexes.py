@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['date', 'id'], name='stocktx_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['product', 'date', 'id'], name='stocktx_product_date_id_idx'),
+        ),
+    ]
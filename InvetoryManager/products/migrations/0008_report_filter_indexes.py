@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_stocktransaction_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('min_stock'))), fields=['created_at'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['transaction_type', 'date', 'id'], name='stocktx_type_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['user', 'date', 'id'], name='stocktx_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_report_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_low_stock_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('quantity__lte', models.F('min_stock'))), output_field=models.BooleanField(), verbose_name='Низкий запас'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='out_of_stock',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('quantity', 0)), output_field=models.BooleanField(), verbose_name='Нет в наличии'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['created_at'], name='product_low_stock_flag_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('out_of_stock', True)), fields=['created_at'], name='product_out_of_stock_idx'),
+        ),
+    ]
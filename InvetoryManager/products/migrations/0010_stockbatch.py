@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_stock_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, verbose_name='Ключ идемпотентности')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='Хеш запроса')),
+                ('response', models.JSONField(verbose_name='Ответ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата проведения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Пакет операций',
+                'verbose_name_plural': 'Пакеты операций',
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'idempotency_key'), name='stockbatch_user_key_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+import re
+from django.db import migrations, models
+
+
+def seed_purchase_sequence(apps, schema_editor):
+    """Счетчик продолжает уже выданные номера вида ПР-000001"""
+    DocumentSequence = apps.get_model('products', 'DocumentSequence')
+    PurchaseInvoice = apps.get_model('products', 'PurchaseInvoice')
+
+    last_value = 0
+    for number in PurchaseInvoice.objects.filter(invoice_number__startswith='ПР-').values_list('invoice_number', flat=True):
+        match = re.fullmatch(r'ПР-(\d+)', number)
+        if match:
+            last_value = max(last_value, int(match.group(1)))
+
+    sequence, created = DocumentSequence.objects.get_or_create(prefix='ПР', defaults={'last_value': last_value})
+    if not created and sequence.last_value < last_value:
+        sequence.last_value = last_value
+        sequence.save(update_fields=['last_value'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_stockbatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=20, unique=True, verbose_name='Префикс')),
+                ('last_value', models.PositiveBigIntegerField(default=0, verbose_name='Последний номер')),
+            ],
+            options={
+                'verbose_name': 'Счетчик номеров',
+                'verbose_name_plural': 'Счетчики номеров',
+            },
+        ),
+        migrations.AlterField(
+            model_name='purchaseinvoice',
+            name='invoice_number',
+            field=models.CharField(blank=True, help_text='Оставьте пустым, чтобы номер присвоился при сохранении', max_length=50, unique=True, verbose_name='Номер накладной'),
+        ),
+        migrations.RunPython(seed_purchase_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_completed_at(apps, schema_editor):
+    # Для проведенных ранее накладных дата проведения — дата последнего изменения
+    PurchaseInvoice = apps.get_model('products', 'PurchaseInvoice')
+    PurchaseInvoice.objects.filter(status='completed', completed_at__isnull=True).update(completed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_document_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductValuation',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valuation', serialize=False, to='products.product', verbose_name='Товар')),
+                ('quantity', models.PositiveIntegerField(default=0, verbose_name='Количество в партиях')),
+                ('average_value', models.DecimalField(decimal_places=4, default=0, max_digits=16, verbose_name='Стоимость по средней цене')),
+                ('fifo_value', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Стоимость по FIFO')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Оценка остатка',
+                'verbose_name_plural': 'Оценка остатков',
+            },
+        ),
+        migrations.AddField(
+            model_name='purchaseinvoice',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата проведения'),
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('received_at', models.DateTimeField(verbose_name='Дата поступления')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Поступило')),
+                ('remaining', models.PositiveIntegerField(verbose_name='Осталось')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Цена закупки')),
+                ('invoice_item', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.purchaseinvoiceitem', verbose_name='Строка накладной')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_layers', to='products.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Партия товара',
+                'verbose_name_plural': 'Партии товаров',
+                'ordering': ['received_at', 'id'],
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['product', 'received_at', 'id'], name='costlayer_open_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_invoice_receipts(apps, schema_editor):
+    # Приход по накладной — операция с комментарием "Приход по накладной <номер>":
+    # ей переносится цена закупки, а партии привязываются к операции вместо строки
+    PurchaseInvoiceItem = apps.get_model('products', 'PurchaseInvoiceItem')
+    StockTransaction = apps.get_model('products', 'StockTransaction')
+    CostLayer = apps.get_model('products', 'CostLayer')
+
+    items = PurchaseInvoiceItem.objects.filter(invoice__status='completed').values_list(
+        'pk', 'product_id', 'purchase_price', 'invoice__invoice_number'
+    )
+    for item_id, product_id, purchase_price, invoice_number in items.iterator():
+        receipt = StockTransaction.objects.filter(
+            product_id=product_id, transaction_type='in', comment=f'Приход по накладной {invoice_number}'
+        ).order_by('id').first()
+        if receipt is None:
+            continue
+        StockTransaction.objects.filter(pk=receipt.pk).update(unit_cost=purchase_price)
+        CostLayer.objects.filter(invoice_item_id=item_id).update(stock_transaction_id=receipt.pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_inventory_valuation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Для прихода без цены берется цена товара на момент проведения', max_digits=10, null=True, verbose_name='Цена прихода'),
+        ),
+        migrations.AddField(
+            model_name='costlayer',
+            name='stock_transaction',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cost_layer', to='products.stocktransaction', verbose_name='Операция прихода'),
+        ),
+        migrations.RunPython(link_invoice_receipts, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='costlayer',
+            name='invoice_item',
+        ),
+    ]
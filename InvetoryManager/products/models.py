@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from PIL import Image
+from django.core.files.storage import default_storage
+from .images import schedule_derivatives
+from .sequences import assign_number
 
 User = get_user_model()
 
@@ -32,14 +34,36 @@ class Product(models.Model):
     min_stock = models.PositiveIntegerField(default=0, verbose_name='Минимальный запас')
     quantity = models.PositiveIntegerField(default=0, verbose_name='Текущий остаток')
     image = models.ImageField(upload_to='products/', blank=True, null=True, verbose_name='Фото')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, verbose_name='Уменьшенные копии фото')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name='Создал')
+    # Вычисляются базой при каждой записи, в том числе при UPDATE остатка из
+    # ledger, поэтому фильтры по низкому и нулевому остатку идут по индексу
+    low_stock = models.GeneratedField(
+        expression=models.Q(quantity__lte=models.F('min_stock')),
+        output_field=models.BooleanField(),
+        db_persist=True,
+        verbose_name='Низкий запас'
+    )
+    out_of_stock = models.GeneratedField(
+        expression=models.Q(quantity=0),
+        output_field=models.BooleanField(),
+        db_persist=True,
+        verbose_name='Нет в наличии'
+    )
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category', 'created_at'], name='product_category_created_idx'),
+            # Частичные индексы: WHERE "low_stock" в запросе совпадает с условием
+            # индекса, и в индекс попадают только товары с низким остатком
+            models.Index(fields=['created_at'], condition=models.Q(low_stock=True), name='product_low_stock_flag_idx'),
+            models.Index(fields=['created_at'], condition=models.Q(out_of_stock=True), name='product_out_of_stock_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.sku})"
@@ -47,14 +71,52 @@ class Product(models.Model):
     def is_low_stock(self):
         return self.quantity <= self.min_stock
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get('image')
+        instance._loaded_stock = (instance.__dict__.get('quantity'), instance.__dict__.get('min_stock'))
+        return instance
+
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        image_changed = (
+            (update_fields is None or 'image' in update_fields)
+            and (self.image.name or None) != (getattr(self, '_loaded_image', None) or None)
+        )
+        if image_changed:
+            self.image_variants = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'image_variants'}
+
         super().save(*args, **kwargs)
 
-        if self.image:
-            img = Image.open(self.image.path)
-            max_size = (150, 150)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            img.save(self.image.path)
+        if image_changed:
+            self._loaded_image = self.image.name
+            if self.image:
+                schedule_derivatives(self.pk, self.image.name)
+
+    def _derivative_image(self, label):
+        variants = self.image_variants.get(label)
+        variants_2x = self.image_variants.get(f'{label}_2x')
+        if not variants or not variants_2x:
+            return None
+        return {
+            'src': default_storage.url(variants['jpeg']),
+            'webp_srcset': f"{default_storage.url(variants['webp'])} 1x, {default_storage.url(variants_2x['webp'])} 2x",
+            'jpeg_srcset': f"{default_storage.url(variants['jpeg'])} 1x, {default_storage.url(variants_2x['jpeg'])} 2x",
+        }
+
+    @property
+    def list_image(self):
+        """Миниатюра для списка товаров или None, пока копии не готовы"""
+        return self._derivative_image('list')
+
+    @property
+    def detail_image(self):
+        """Изображение для карточки товара или None, пока копии не готовы"""
+        return self._derivative_image('detail')
+
 
 class StockTransaction(models.Model):
     TRANSACTION_TYPES = [
@@ -68,16 +130,45 @@ class StockTransaction(models.Model):
     date = models.DateTimeField(auto_now_add=True, verbose_name='Дата операции')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name='Пользователь')
     comment = models.TextField(blank=True, verbose_name='Комментарий')
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                    verbose_name='Цена прихода',
+                                    help_text='Для прихода без цены берется цена товара на момент проведения')
 
     class Meta:
         verbose_name = 'Операция с товаром'
         verbose_name_plural = 'Операции с товарами'
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'id'], name='stocktx_date_id_idx'),
+            models.Index(fields=['product', 'date', 'id'], name='stocktx_product_date_id_idx'),
+            models.Index(fields=['transaction_type', 'date', 'id'], name='stocktx_type_date_id_idx'),
+            models.Index(fields=['user', 'date', 'id'], name='stocktx_user_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} {self.product.name} - {self.quantity}"
 
 
+class StockBatch(models.Model):
+    """Проведенный пакет операций из API; ключ идемпотентности защищает от повторного проведения"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    idempotency_key = models.CharField(max_length=255, verbose_name='Ключ идемпотентности')
+    request_hash = models.CharField(max_length=64, verbose_name='Хеш запроса')
+    response = models.JSONField(verbose_name='Ответ')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата проведения')
+
+    class Meta:
+        verbose_name = 'Пакет операций'
+        verbose_name_plural = 'Пакеты операций'
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='stockbatch_user_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.idempotency_key} ({self.user})"
+
+
 class Supplier(models.Model):
     name = models.CharField(max_length=255, verbose_name='Название поставщика')
     contact_person = models.CharField(max_length=255, blank=True, verbose_name='Контактное лицо')
@@ -95,14 +186,29 @@ class Supplier(models.Model):
         return self.name
 
 
+class DocumentSequence(models.Model):
+    """Счетчик номеров документов одного типа (ПР, РС, ...)"""
+    prefix = models.CharField(max_length=20, unique=True, verbose_name='Префикс')
+    last_value = models.PositiveBigIntegerField(default=0, verbose_name='Последний номер')
+
+    class Meta:
+        verbose_name = 'Счетчик номеров'
+        verbose_name_plural = 'Счетчики номеров'
+
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+
+
 class PurchaseInvoice(models.Model):
+    NUMBER_PREFIX = 'ПР'
     STATUS_CHOICES = [
         ('draft', 'Черновик'),
         ('completed', 'Завершена'),
         ('cancelled', 'Отменена'),
     ]
 
-    invoice_number = models.CharField(max_length=50, unique=True, verbose_name='Номер накладной')
+    invoice_number = models.CharField(max_length=50, unique=True, blank=True, verbose_name='Номер накладной',
+                                      help_text='Оставьте пустым, чтобы номер присвоился при сохранении')
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT, verbose_name='Поставщик')
     invoice_date = models.DateField(verbose_name='Дата накладной')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft', verbose_name='Статус')
@@ -111,6 +217,7 @@ class PurchaseInvoice(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name='Создал')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата проведения')
 
     class Meta:
         verbose_name = 'Накладная прихода'
@@ -120,6 +227,14 @@ class PurchaseInvoice(models.Model):
     def __str__(self):
         return f"Накладная {self.invoice_number} от {self.invoice_date}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # Номер занимается в той же транзакции, что и сама накладная
+        with transaction.atomic():
+            assign_number(self, self.NUMBER_PREFIX)
+            super().save(*args, **kwargs)
+
     def update_total_amount(self):
         total = self.purchaseinvoiceitem_set.aggregate(
             total=models.Sum(models.F('quantity') * models.F('purchase_price'))
@@ -127,6 +242,20 @@ class PurchaseInvoice(models.Model):
         self.total_amount = total
         self.save()
 
+    def add_items(self, items):
+        """Запись строк накладной одним bulk_create и один пересчет суммы в конце.
+
+        Построчный save() пересчитывает сумму после каждой строки, поэтому для
+        накладных из многих строк используется этот метод.
+        """
+        items = list(items)
+        for item in items:
+            item.invoice = self
+            item.total_price = item.quantity * item.purchase_price
+        PurchaseInvoiceItem.objects.bulk_create(items)
+        self.update_total_amount()
+        return items
+
 
 class PurchaseInvoiceItem(models.Model):
     invoice = models.ForeignKey(PurchaseInvoice, on_delete=models.CASCADE, verbose_name='Накладная')
@@ -152,4 +281,54 @@ class PurchaseInvoiceItem(models.Model):
     def delete(self, *args, **kwargs):
         invoice = self.invoice
         super().delete(*args, **kwargs)
-        invoice.update_total_amount()
\ No newline at end of file
+        invoice.update_total_amount()
+
+
+class CostLayer(models.Model):
+    """Партия товара по цене прихода; расход списывает партии по FIFO"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_layers', verbose_name='Товар')
+    stock_transaction = models.OneToOneField(StockTransaction, on_delete=models.SET_NULL, null=True, blank=True,
+                                             related_name='cost_layer', verbose_name='Операция прихода')
+    received_at = models.DateTimeField(verbose_name='Дата поступления')
+    quantity = models.PositiveIntegerField(verbose_name='Поступило')
+    remaining = models.PositiveIntegerField(verbose_name='Осталось')
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена закупки')
+
+    class Meta:
+        verbose_name = 'Партия товара'
+        verbose_name_plural = 'Партии товаров'
+        ordering = ['received_at', 'id']
+        indexes = [
+            models.Index(
+                fields=['product', 'received_at', 'id'],
+                condition=models.Q(remaining__gt=0),
+                name='costlayer_open_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.remaining}/{self.quantity} по {self.unit_cost}"
+
+
+class ProductValuation(models.Model):
+    """Себестоимость остатка товара по FIFO и по средневзвешенной цене"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='valuation',
+                                   verbose_name='Товар')
+    quantity = models.PositiveIntegerField(default=0, verbose_name='Количество в партиях')
+    average_value = models.DecimalField(max_digits=16, decimal_places=4, default=0,
+                                        verbose_name='Стоимость по средней цене')
+    fifo_value = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Стоимость по FIFO')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Оценка остатка'
+        verbose_name_plural = 'Оценка остатков'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.fifo_value}"
+
+    @property
+    def average_cost(self):
+        if not self.quantity:
+            return 0
+        return self.average_value / self.quantity
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+APPROXIMATE_COUNT_LIMIT = 10000
+
+
+class KeysetPage:
+    """Страница выборки, упорядоченной по (-date, -id), с курсорами соседних страниц"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def encode_cursor(obj, direction):
+    payload = json.dumps({'d': obj.date.isoformat(), 'i': obj.pk, 'r': direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        date = parse_datetime(payload['d'])
+        if date is None or payload['r'] not in ('next', 'prev'):
+            return None
+        return date, int(payload['i']), payload['r']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+
+
+def keyset_paginate(queryset, cursor, per_page):
+    """Постраничный вывод по ключу (date, id) вместо OFFSET.
+
+    Каждая страница читается по индексу (date, id) начиная с позиции
+    курсора, поэтому стоимость не зависит от номера страницы и COUNT(*) не
+    нужен. Некорректный курсор открывает первую страницу. Условие на
+    границу date повторяется отдельно от OR: по нему индекс ищет позицию
+    курсора, а не читается с начала.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    if position is None:
+        rows = list(queryset.order_by('-date', '-id')[:per_page + 1])
+        has_more, has_before = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        date, pk, direction = position
+        if direction == 'next':
+            rows = list(queryset.filter(
+                Q(date__lt=date) | Q(date=date, id__lt=pk), date__lte=date
+            ).order_by('-date', '-id')[:per_page + 1])
+            has_more, has_before = len(rows) > per_page, True
+            rows = rows[:per_page]
+        else:
+            rows = list(queryset.filter(
+                Q(date__gt=date) | Q(date=date, id__gt=pk), date__gte=date
+            ).order_by('date', 'id')[:per_page + 1])
+            has_more, has_before = True, len(rows) > per_page
+            rows = rows[:per_page][::-1]
+
+    if not rows:
+        return KeysetPage([], None, None)
+
+    return KeysetPage(
+        rows,
+        encode_cursor(rows[-1], 'next') if has_more else None,
+        encode_cursor(rows[0], 'prev') if has_before else None,
+    )
+
+
+def approximate_count(queryset, limit=APPROXIMATE_COUNT_LIMIT):
+    """Число строк, но не больше limit: (count, is_capped).
+
+    Подсчет останавливается на limit + 1 строке, поэтому стоит не дороже
+    чтения одной страницы индекса даже на больших таблицах.
+    """
+    count = queryset.order_by()[:limit + 1].count()
+    return min(count, limit), count > limit
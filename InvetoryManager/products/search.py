@@ -0,0 +1,113 @@
+import re
+from django.db import connection
+from django.db.models import Q, BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+PG_INDEX = 'products_product_search_idx'
+PG_DOCUMENT = (
+    "to_tsvector('simple', coalesce(\"products_product\".\"name\", '') || ' ' || "
+    "coalesce(\"products_product\".\"sku\", '') || ' ' || coalesce(\"products_product\".\"description\", ''))"
+)
+
+SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, sku, description,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, sku, description ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, sku, description) VALUES (new.id, new.name, new.sku, new.description);
+    END""",
+]
+SQLITE_TRIGGERS = {f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au'}
+
+
+def _tokens(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def search_supported(using=connection):
+    return using.vendor in ('sqlite', 'postgresql')
+
+
+def ensure_search_index(using=connection):
+    """Создание индекса и триггеров, если их нет.
+
+    На SQLite Django пересоздает таблицу при части ALTER TABLE, и триггеры
+    пропадают вместе со старой таблицей, поэтому функция вызывается после
+    каждой миграции и при отсутствии триггеров перестраивает индекс.
+    """
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'products_product'")
+            if SQLITE_TRIGGERS <= {row[0] for row in cursor.fetchall()}:
+                return
+            for statement in SQLITE_SETUP:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif using.vendor == 'postgresql':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON products_product USING GIN ({PG_DOCUMENT})')
+
+
+def rebuild_search_index(using=connection):
+    with using.cursor() as cursor:
+        if using.vendor == 'sqlite':
+            for statement in SQLITE_SETUP:
+                cursor.execute(statement)
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif using.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {PG_INDEX}')
+            cursor.execute(f'CREATE INDEX {PG_INDEX} ON products_product USING GIN ({PG_DOCUMENT})')
+
+
+def search_products(queryset, query):
+    """Полнотекстовый поиск по названию, артикулу и описанию.
+
+    Точное совпадение артикула отдается сразу по уникальному индексу.
+    Иначе каждое слово запроса ищется как префикс, результаты
+    упорядочены по релевантности. На СУБД без полнотекстового индекса
+    используется поиск по подстроке.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    exact = queryset.filter(sku=query)
+    if exact.exists():
+        return exact
+
+    tokens = _tokens(query)
+    if not tokens or not search_supported():
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(description__icontains=query)
+        )
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "products_product"."id"',
+                [match], output_field=FloatField()
+            )
+        ).order_by('search_rank')
+
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    return queryset.filter(
+        RawSQL(f"{PG_DOCUMENT} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+    ).annotate(
+        search_rank=RawSQL(f"ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+    ).order_by('-search_rank')
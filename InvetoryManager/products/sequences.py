@@ -0,0 +1,77 @@
+import re
+from django.db import connection, transaction
+
+NUMBER_WIDTH = 6
+
+
+def _increment(prefix):
+    """Увеличение счетчика; None, если счетчика еще нет"""
+    from .models import DocumentSequence
+
+    if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_columns_from_insert:
+        sql = 'UPDATE {table} SET {value} = {value} + 1 WHERE {prefix} = %s RETURNING {value}'.format(
+            table=connection.ops.quote_name(DocumentSequence._meta.db_table),
+            value=connection.ops.quote_name('last_value'),
+            prefix=connection.ops.quote_name('prefix'),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [prefix])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    sequence = DocumentSequence.objects.select_for_update().filter(prefix=prefix).first()
+    if sequence is None:
+        return None
+    sequence.last_value += 1
+    sequence.save(update_fields=['last_value'])
+    return sequence.last_value
+
+
+def allocate(prefix):
+    """Следующее значение счетчика документов с префиксом prefix.
+
+    Значение выдается одним UPDATE ... RETURNING, и строка счетчика остается
+    заблокированной до конца транзакции: параллельные сохранения получают
+    разные значения, а при откате значение возвращается в счетчик, поэтому
+    номера идут без пропусков. Вызывать в транзакции, которая сохраняет
+    документ. Счетчик для нового типа документов создается при первом
+    обращении.
+    """
+    from .models import DocumentSequence
+
+    with transaction.atomic():
+        value = _increment(prefix)
+        if value is None:
+            DocumentSequence.objects.get_or_create(prefix=prefix)
+            value = _increment(prefix)
+    return value
+
+
+def advance(prefix, value):
+    """Сдвиг счетчика вперед до value, если номер занят вручную"""
+    from .models import DocumentSequence
+
+    sequence, created = DocumentSequence.objects.get_or_create(prefix=prefix, defaults={'last_value': value})
+    if not created:
+        DocumentSequence.objects.filter(pk=sequence.pk, last_value__lt=value).update(last_value=value)
+
+
+def format_number(prefix, value):
+    return f'{prefix}-{value:0{NUMBER_WIDTH}d}'
+
+
+def assign_number(document, prefix):
+    """Номер для нового документа.
+
+    Пустой номер заполняется из счетчика. Номер, введенный вручную в том же
+    формате, сдвигает счетчик, чтобы следующий выданный номер с ним не
+    совпал.
+    """
+    if not document.invoice_number:
+        document.invoice_number = format_number(prefix, allocate(prefix))
+        return
+
+    match = re.fullmatch(rf'{re.escape(prefix)}-(\d+)', document.invoice_number)
+    if match:
+        advance(prefix, int(match.group(1)))
+
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Отправляется после массовой записи операций через products.ledger.
+# bulk_create не вызывает post_save, поэтому получатели, которым нужны
+# новые операции (дневные итоги, уведомления о запасе), слушают этот сигнал.
+# Аргументы: transactions — список сохраненных StockTransaction.
+stock_transactions_created = Signal()
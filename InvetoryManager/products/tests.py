@@ -1,3 +1,321 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+from reports.queries import movement_queryset, stock_queryset
+from . import ledger
+from .imports import CategoryLookup, ImportResult, _upsert, import_products
+from .ledger import InsufficientStock, apply_transactions
+from .models import (
+    Category, CostLayer, DocumentSequence, Product, ProductValuation, PurchaseInvoice, StockTransaction, Supplier,
+)
+from .pagination import keyset_paginate
+from .sequences import format_number
+from .valuation_rebuild import check_valuation
 
-# Create your tests here.
+User = get_user_model()
+
+
+def create_product(sku, quantity=0, **fields):
+    return Product.objects.create(name=f'Товар {sku}', sku=sku, price=10, quantity=quantity, **fields)
+
+
+def run_in_threads(target, count):
+    """target(номер потока) в count потоках, стартующих одновременно; возвращает исключения потоков"""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class LedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+
+    def test_insufficient_stock_names_short_product(self):
+        """В ошибке указан товар с нехваткой, а не товар, уже списанный в том же UPDATE"""
+        short = create_product('G-003', quantity=3)
+        enough = create_product('G-010', quantity=10)
+
+        with self.assertRaises(InsufficientStock) as raised:
+            apply_transactions([
+                StockTransaction(product=enough, transaction_type='out', quantity=6),
+                StockTransaction(product=short, transaction_type='out', quantity=50),
+            ], self.user)
+
+        self.assertEqual(raised.exception.product.pk, short.pk)
+        enough.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual((enough.quantity, short.quantity), (10, 3))
+        self.assertFalse(StockTransaction.objects.exists())
+
+    def test_update_is_retried_when_shortage_is_gone(self):
+        """Нехватку к повторному чтению сняла параллельная операция: UPDATE повторяется"""
+        product = create_product('G-020', quantity=5)
+        update = ledger._update_quantities
+        calls = []
+
+        def flaky(deltas, now):
+            # Первый UPDATE не проходит, хотя при чтении остатка хватает
+            calls.append(deltas)
+            return 0 if len(calls) == 1 else update(deltas, now)
+
+        with mock.patch.object(ledger, '_update_quantities', side_effect=flaky):
+            apply_transactions([StockTransaction(product=product, transaction_type='out', quantity=2)], self.user)
+
+        self.assertEqual(len(calls), 2)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 3)
+
+    def test_unresolved_update_raises_insufficient_stock(self):
+        """Если UPDATE так и не прошел, вызывающий код получает InsufficientStock"""
+        product = create_product('G-021', quantity=5)
+
+        with mock.patch.object(ledger, '_update_quantities', return_value=0) as patched:
+            with self.assertRaises(InsufficientStock) as raised:
+                apply_transactions([StockTransaction(product=product, transaction_type='out', quantity=2)], self.user)
+
+        self.assertEqual(patched.call_count, ledger.UPDATE_ATTEMPTS)
+        self.assertEqual(raised.exception.product.pk, product.pk)
+        self.assertFalse(StockTransaction.objects.exists())
+
+
+class ValuationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+
+    def test_manual_outgoing_operation_consumes_cost_layers(self):
+        product = create_product('G-001')
+        apply_transactions([
+            StockTransaction(product=product, transaction_type='in', quantity=10, unit_cost=10),
+            StockTransaction(product=product, transaction_type='in', quantity=10, unit_cost=20),
+        ], self.user)
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('products:transaction'), {
+            'product': product.pk, 'transaction_type': 'out', 'quantity': 5, 'comment': '',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        product.refresh_from_db()
+        valuation = ProductValuation.objects.get(product=product)
+        self.assertEqual(valuation.quantity, product.quantity)
+        self.assertEqual(valuation.quantity, 15)
+        # FIFO списывает 5 шт. первой партии по 10, средняя — четверть стоимости
+        self.assertEqual(valuation.fifo_value, Decimal('250'))
+        self.assertEqual(valuation.average_value, Decimal('225'))
+        self.assertEqual(list(CostLayer.objects.order_by('id').values_list('remaining', flat=True)), [5, 10])
+
+    def test_receipt_without_cost_is_valued_at_product_price_and_matches_rebuild(self):
+        product = create_product('G-001')
+        apply_transactions([StockTransaction(product=product, transaction_type='in', quantity=4)], self.user)
+        Product.objects.filter(pk=product.pk).update(price=99)
+        apply_transactions([StockTransaction(product=product, transaction_type='out', quantity=1)], self.user)
+
+        valuation = ProductValuation.objects.get(product=product)
+        self.assertEqual((valuation.quantity, valuation.fifo_value), (3, Decimal('30')))
+        self.assertEqual(check_valuation(), [])
+
+
+class ImportTests(TestCase):
+    def test_reimport_posts_quantity_difference_as_transaction(self):
+        import_products([['sku', 'name', 'price', 'quantity'], ['G-001', 'Товар', '10', '6']])
+        import_products([['sku', 'name', 'price', 'quantity'], ['G-001', 'Товар', '10', '7']])
+        import_products([['sku', 'name', 'price', 'quantity'], ['G-001', 'Товар', '10', '2']])
+
+        product = Product.objects.get(sku='G-001')
+        self.assertEqual(product.quantity, 2)
+        self.assertEqual(
+            list(StockTransaction.objects.order_by('id').values_list('transaction_type', 'quantity')),
+            [('in', 1), ('out', 5)],
+        )
+
+    def test_rolled_back_chunk_keeps_created_categories(self):
+        categories = CategoryLookup()
+        fields = ['sku', 'name', 'price', 'category']
+        row = {'sku': 'G-001', 'name': 'Товар', 'price': 10, 'category': 'Новая'}
+
+        with mock.patch.object(Product.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                _upsert([row], fields, categories, None, ImportResult())
+        _upsert([{**row, 'sku': 'G-002'}], fields, categories, None, ImportResult())
+
+        category = Category.objects.get(name='Новая')
+        self.assertEqual(Product.objects.get(sku='G-002').category, category)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'План запроса SQLite')
+class QueryPlanTests(TestCase):
+    """Запросы списков и отчетов читают строки по составным и частичным индексам, а не полным просмотром"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+        cls.category = Category.objects.create(name='Категория')
+        cls.product = create_product('G-001', quantity=10, category=cls.category)
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertRegex(plan, rf'USING (COVERING )?INDEX {index}\b', plan)
+        self.assertNotRegex(plan, r'(?m)\bSCAN \S+$', plan)
+
+    def transaction_page(self, transactions):
+        return transactions.order_by('-date', '-id')[:21]
+
+    def test_transaction_filters_use_composite_indexes(self):
+        self.assertUsesIndex(self.transaction_page(movement_queryset({})), 'stocktx_date_id_idx')
+        self.assertUsesIndex(self.transaction_page(movement_queryset({'product': self.product.pk})), 'stocktx_product_date_id_idx')
+        self.assertUsesIndex(self.transaction_page(movement_queryset({'type': 'in'})), 'stocktx_type_date_id_idx')
+        self.assertUsesIndex(self.transaction_page(StockTransaction.objects.filter(user=self.user)), 'stocktx_user_date_id_idx')
+
+    def test_cursor_page_seeks_index(self):
+        """Страница по курсору начинается с позиции курсора в индексе, а не с начала индекса"""
+        first = create_product('G-002')
+        apply_transactions([StockTransaction(product=first, transaction_type='in', quantity=1) for step in range(3)], self.user)
+        cursor = keyset_paginate(StockTransaction.objects.all(), None, 1).next_cursor
+
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            keyset_paginate(StockTransaction.objects.all(), cursor, 1)
+        sql, params = queries[0]
+        with connection.cursor() as db_cursor:
+            db_cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = '\n'.join(row[-1] for row in db_cursor.fetchall())
+
+        self.assertIn('SEARCH products_stocktransaction USING INDEX stocktx_date_id_idx (date<?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_product_filters_use_indexes(self):
+        self.assertUsesIndex(stock_queryset({'low_stock': '1'}).order_by('-created_at'), 'product_low_stock_flag_idx')
+        self.assertUsesIndex(stock_queryset({'category': self.category.pk}).order_by('-created_at'), 'product_category_created_idx')
+
+    def test_notification_queries_use_indexes(self):
+        notifications = Notification.objects.filter(user=self.user).order_by('-created_at')
+        self.assertUsesIndex(notifications, 'notif_user_created_idx')
+        self.assertUsesIndex(notifications.filter(is_read=False), 'notif_user_unread_idx')
+
+
+class LedgerConcurrencyTests(TransactionTestCase):
+    THREADS = 10
+    OPERATIONS = 20
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+
+    def test_parallel_operations_on_one_product_lose_no_updates(self):
+        product = create_product('G-001', quantity=100)
+
+        def post(index):
+            transaction_type = 'in' if index % 2 else 'out'
+            for step in range(self.OPERATIONS):
+                apply_transactions([StockTransaction(product=product, transaction_type=transaction_type, quantity=2)], self.user)
+
+        errors = run_in_threads(post, self.THREADS)
+
+        self.assertEqual(errors, [])
+        product.refresh_from_db()
+        # Приходы и расходы поровну: остаток возвращается к исходному
+        self.assertEqual(product.quantity, 100)
+        self.assertEqual(StockTransaction.objects.count(), self.THREADS * self.OPERATIONS)
+
+    def test_parallel_outgoing_operations_never_go_negative(self):
+        product = create_product('G-001', quantity=50)
+        succeeded = []
+
+        def post(index):
+            for step in range(self.OPERATIONS):
+                try:
+                    apply_transactions([StockTransaction(product=product, transaction_type='out', quantity=1)], self.user)
+                except InsufficientStock:
+                    continue
+                succeeded.append(index)
+
+        errors = run_in_threads(post, self.THREADS)
+
+        self.assertEqual(errors, [])
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(len(succeeded), 50)
+        self.assertEqual(StockTransaction.objects.count(), 50)
+
+
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    INVOICES = 10
+
+    def test_parallel_invoices_get_contiguous_numbers(self):
+        """Номера из параллельных транзакций не совпадают и идут без пропусков, в том числе после откатов"""
+        user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+        supplier = Supplier.objects.create(name='Поставщик')
+
+        def create(index):
+            for step in range(self.INVOICES):
+                try:
+                    with transaction.atomic():
+                        PurchaseInvoice.objects.create(supplier=supplier, invoice_date=timezone.localdate(), created_by=user)
+                        if step % 3 == 2:
+                            raise RuntimeError('Откат')
+                except RuntimeError:
+                    pass
+
+        errors = run_in_threads(create, self.THREADS)
+
+        self.assertEqual(errors, [])
+        numbers = sorted(PurchaseInvoice.objects.values_list('invoice_number', flat=True))
+        created = self.THREADS * (self.INVOICES - self.INVOICES // 3)
+        prefix = PurchaseInvoice.NUMBER_PREFIX
+        self.assertEqual(numbers, [format_number(prefix, value) for value in range(1, created + 1)])
+        self.assertEqual(DocumentSequence.objects.get(prefix=prefix).last_value, created)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Настройки SQLite')
+class SQLiteConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    OPERATIONS = 25
+
+    def test_connection_uses_wal(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_parallel_writers_are_not_locked_out(self):
+        """Параллельные операции ждут блокировку записи, а не получают ошибку database is locked"""
+        user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+        products = [create_product(f'G-{index:03d}') for index in range(4)]
+
+        def post(index):
+            for step in range(self.OPERATIONS):
+                product = products[(index + step) % len(products)]
+                apply_transactions([StockTransaction(product=product, transaction_type='in', quantity=1)], user)
+
+        errors = run_in_threads(post, self.THREADS)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(StockTransaction.objects.count(), self.THREADS * self.OPERATIONS)
+        self.assertEqual(sum(Product.objects.values_list('quantity', flat=True)), self.THREADS * self.OPERATIONS)
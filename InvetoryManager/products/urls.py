@@ -6,9 +6,12 @@ app_name = 'products'
 urlpatterns = [
     path('', views.product_list, name='list'),
     path('create/', views.product_create, name='create'),
+    path('lookup/', views.product_lookup, name='lookup'),
+    path('import/', views.product_import, name='import'),
     path('<int:pk>/update/', views.product_update, name='update'),
     path('<int:pk>/delete/', views.product_delete, name='delete'),
     path('transaction/', views.stock_transaction, name='transaction'),
+    path('api/stock-batch/', views.stock_batch, name='stock_batch'),
     path('history/', views.transaction_history, name='history'),
     path('suppliers/', views.supplier_list, name='supplier_list'),
     path('suppliers/create/', views.supplier_create, name='supplier_create'),
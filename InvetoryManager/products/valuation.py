@@ -0,0 +1,158 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import CostLayer, Product, ProductValuation
+
+# Точность хранения стоимости по средней цене: округление при каждом
+# расходе не накапливает заметной ошибки
+AVERAGE_PRECISION = Decimal('0.0001')
+
+
+def _lock_valuations(product_ids):
+    """Строки оценки товаров под блокировкой в порядке id; недостающие создаются"""
+    product_ids = sorted(set(product_ids))
+    ProductValuation.objects.bulk_create(
+        [ProductValuation(product_id=pk) for pk in product_ids], ignore_conflicts=True
+    )
+    return {
+        valuation.product_id: valuation
+        for valuation in ProductValuation.objects.select_for_update().filter(
+            product_id__in=product_ids
+        ).order_by('product_id')
+    }
+
+
+def _save_valuations(valuations):
+    """Один UPDATE на все товары через executemany"""
+    sql = 'UPDATE {table} SET {quantity} = %s, {average_value} = %s, {fifo_value} = %s, {updated_at} = %s WHERE {product} = %s'.format(
+        table=connection.ops.quote_name(ProductValuation._meta.db_table),
+        quantity=connection.ops.quote_name('quantity'),
+        average_value=connection.ops.quote_name('average_value'),
+        fifo_value=connection.ops.quote_name('fifo_value'),
+        updated_at=connection.ops.quote_name('updated_at'),
+        product=connection.ops.quote_name('product_id'),
+    )
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (valuation.quantity, valuation.average_value, valuation.fifo_value, now, valuation.product_id)
+            for valuation in valuations
+        ])
+
+
+def receive(entries, received_at=None):
+    """Приход партий товара.
+
+    entries — [(id товара, количество, цена прихода, id операции прихода)].
+    Каждая строка становится партией для FIFO, средняя цена товара
+    пересчитывается по сумме прихода. Вызывать в транзакции проведения.
+    """
+    entries = [entry for entry in entries if entry[1] > 0]
+    if not entries:
+        return
+    received_at = received_at or timezone.now()
+
+    with transaction.atomic():
+        valuations = _lock_valuations(product_id for product_id, *rest in entries)
+        CostLayer.objects.bulk_create([
+            CostLayer(
+                product_id=product_id, stock_transaction_id=transaction_id, received_at=received_at,
+                quantity=quantity, remaining=quantity, unit_cost=unit_cost
+            )
+            for product_id, quantity, unit_cost, transaction_id in entries
+        ])
+
+        for product_id, quantity, unit_cost, transaction_id in entries:
+            valuation = valuations[product_id]
+            valuation.quantity += quantity
+            valuation.average_value += quantity * unit_cost
+            valuation.fifo_value += quantity * unit_cost
+        _save_valuations(valuations.values())
+
+
+def issue(entries):
+    """Расход товара: entries — [(id товара, количество)].
+
+    Списываются самые старые партии, стоимость по средней уменьшается
+    пропорционально количеству. Расход сверх количества в партиях (остаток,
+    заведенный в карточке товара без операции прихода) не оценивается. Возвращает себестоимость
+    списанного по FIFO: {id товара: сумма}.
+    """
+    quantities = defaultdict(int)
+    for product_id, quantity in entries:
+        quantities[product_id] += quantity
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        valuations = _lock_valuations(quantities)
+
+        pending = dict(quantities)
+        fifo_cost = defaultdict(Decimal)
+        layer_updates = []
+        layers = CostLayer.objects.select_for_update().filter(
+            product_id__in=list(quantities), remaining__gt=0
+        ).order_by('product_id', 'received_at', 'id').only('id', 'product_id', 'remaining', 'unit_cost')
+        for layer in layers:
+            taken = min(pending[layer.product_id], layer.remaining)
+            if not taken:
+                continue
+            pending[layer.product_id] -= taken
+            fifo_cost[layer.product_id] += taken * layer.unit_cost
+            layer_updates.append((layer.remaining - taken, layer.pk))
+
+        if layer_updates:
+            sql = 'UPDATE {table} SET {remaining} = %s WHERE {id} = %s'.format(
+                table=connection.ops.quote_name(CostLayer._meta.db_table),
+                remaining=connection.ops.quote_name('remaining'),
+                id=connection.ops.quote_name('id'),
+            )
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, layer_updates)
+
+        for product_id, quantity in quantities.items():
+            valuation = valuations[product_id]
+            issued = quantity - pending[product_id]
+            if not issued:
+                continue
+            if issued == valuation.quantity:
+                valuation.average_value = Decimal(0)
+            else:
+                valuation.average_value -= (valuation.average_value * issued / valuation.quantity).quantize(AVERAGE_PRECISION)
+            valuation.quantity -= issued
+            valuation.fifo_value -= fifo_cost[product_id]
+        _save_valuations(valuations.values())
+
+    return dict(fifo_cost)
+
+
+def price_receipts(transactions):
+    """Цена прихода для операций, пришедших без нее: текущая цена товара.
+
+    Цена сохраняется в самой операции, поэтому пересчет по истории
+    (valuation_rebuild) оценивает приход так же, как при проведении.
+    """
+    unpriced = [t for t in transactions if t.transaction_type == 'in' and t.unit_cost is None]
+    if not unpriced:
+        return
+    prices = dict(Product.objects.filter(pk__in={t.product_id for t in unpriced}).values_list('pk', 'price'))
+    for stock_transaction in unpriced:
+        stock_transaction.unit_cost = prices[stock_transaction.product_id]
+
+
+def post_transactions(transactions):
+    """Партии и оценка по записанным операциям склада.
+
+    Приходы становятся партиями, затем расходы списывают партии по FIFO;
+    так же события упорядочены в пересчете по истории. Вызывается из
+    apply_transactions, поэтому оценку не обходит ни один путь движения
+    товара.
+    """
+    receipts = [t for t in transactions if t.transaction_type == 'in']
+    if receipts:
+        receive(
+            [(t.product_id, t.quantity, t.unit_cost, t.pk) for t in receipts],
+            received_at=receipts[0].date,
+        )
+    return issue((t.product_id, t.quantity) for t in transactions if t.transaction_type == 'out')
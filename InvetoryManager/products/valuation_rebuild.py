@@ -0,0 +1,148 @@
+from decimal import Decimal
+import numpy as np
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from .models import CostLayer, ProductValuation, StockTransaction
+from .valuation import AVERAGE_PRECISION
+
+REBUILD_BATCH_SIZE = 2000
+AVERAGE_TOLERANCE = Decimal('0.01')
+
+
+class ValuationState:
+    """Результат пересчета по истории: партии и оценка по товарам"""
+
+    def __init__(self, layers, valuations):
+        self.layers = layers
+        self.valuations = valuations
+
+
+def _load_events():
+    transactions = StockTransaction.objects.annotate(
+        cost=Coalesce('unit_cost', 'product__price')
+    ).values_list('pk', 'product_id', 'transaction_type', 'quantity', 'cost', 'date')
+
+    return [
+        (product_id, at.timestamp(), 0, pk, quantity, int(cost * 100), at)
+        if transaction_type == 'in' else
+        (product_id, at.timestamp(), 1, pk, -quantity, 0, at)
+        for pk, product_id, transaction_type, quantity, cost, at in transactions.iterator(chunk_size=REBUILD_BATCH_SIZE)
+    ]
+
+
+def _group_cumsum(values, group, starts):
+    totals = np.cumsum(values)
+    return totals - (totals - values)[starts][group]
+
+
+def _group_running_min(values, group, span):
+    # Сдвиг групп на span, больший размаха значений, не дает минимуму
+    # предыдущих групп попасть в текущую, и один accumulate считает все группы
+    shifted = values - group * span
+    return np.minimum.accumulate(shifted) + group * span
+
+
+def compute_state():
+    """Оценка по всей истории операций склада, векторно по всем товарам.
+
+    События сортируются по (товар, время операции, приход раньше расхода).
+    Количество в партиях — накопленная сумма движения, ограниченная снизу
+    нулем: расход сверх партий не оценивается, как и в инкрементальном
+    учете. Остаток FIFO зависит только от общего списанного количества:
+    партия k сохраняет clip(приход до k включительно - списано, 0, q_k).
+    Стоимость по средней после последнего обнуления остатка — сумма
+    приходов, умноженных на произведение долей, оставшихся после каждого
+    следующего расхода; произведения считаются через накопленную сумму
+    логарифмов.
+    """
+    events = _load_events()
+    if not events:
+        return ValuationState([], {})
+
+    events.sort(key=lambda event: event[:4])
+    product = np.array([event[0] for event in events], dtype=np.int64)
+    signed = np.array([event[4] for event in events], dtype=np.int64)
+    cents = np.array([event[5] for event in events], dtype=np.int64)
+    is_receipt = signed > 0
+
+    starts = np.r_[True, product[1:] != product[:-1]]
+    start_index = np.flatnonzero(starts)
+    group = np.cumsum(starts) - 1
+
+    level = _group_cumsum(signed, group, starts)
+    span = 2 * int(np.abs(signed).sum()) + 1
+    available = level - np.minimum(_group_running_min(level, group, span), 0)
+
+    previous = np.r_[0, available[:-1]]
+    previous[starts] = 0
+    consumed = np.where(is_receipt, 0, previous - available)
+    total_consumed = np.add.reduceat(consumed, start_index)
+
+    received = np.where(is_receipt, signed, 0)
+    received_through = _group_cumsum(received, group, starts)
+    remaining = np.where(is_receipt, np.clip(received_through - total_consumed[group], 0, received), 0)
+    fifo_cents = np.add.reduceat(remaining * cents, start_index)
+    quantity = available[np.r_[start_index[1:], len(events)] - 1]
+
+    positions = np.arange(len(events))
+    last_empty = np.maximum.reduceat(np.where(available == 0, positions, -1), start_index)
+    active = positions > last_empty[group]
+    ratio = np.ones(len(events))
+    shrinking = active & ~is_receipt & (previous > 0)
+    ratio[shrinking] = available[shrinking] / previous[shrinking]
+    log_ratio = _group_cumsum(np.log(ratio), group, starts)
+    group_log = log_ratio[np.r_[start_index[1:], len(events)] - 1]
+    weights = np.where(active & is_receipt, np.exp(group_log[group] - log_ratio), 0.0)
+    average_cents = np.add.reduceat(weights * (received * cents), start_index)
+
+    layers = [
+        CostLayer(
+            product_id=events[k][0], stock_transaction_id=events[k][3], received_at=events[k][6],
+            quantity=events[k][4], remaining=int(remaining[k]), unit_cost=Decimal(events[k][5]) / 100
+        )
+        for k in np.flatnonzero(is_receipt)
+    ]
+    valuations = {
+        int(product[start]): ProductValuation(
+            product_id=int(product[start]),
+            quantity=int(quantity[g]),
+            average_value=(Decimal(float(average_cents[g])) / 100).quantize(AVERAGE_PRECISION),
+            fifo_value=Decimal(int(fifo_cents[g])) / 100,
+        )
+        for g, start in enumerate(start_index)
+    }
+    return ValuationState(layers, valuations)
+
+
+@transaction.atomic
+def rebuild_valuation():
+    """Полный пересчет партий и оценки по истории операций; возвращает число товаров"""
+    state = compute_state()
+    CostLayer.objects.all().delete()
+    ProductValuation.objects.all().delete()
+    CostLayer.objects.bulk_create(state.layers, batch_size=REBUILD_BATCH_SIZE)
+    ProductValuation.objects.bulk_create(state.valuations.values(), batch_size=REBUILD_BATCH_SIZE)
+    return len(state.valuations)
+
+
+def check_valuation():
+    """Расхождения текущей оценки с пересчетом по истории.
+
+    Возвращает [(id товара, поле, текущее значение, по истории)]. Количество
+    и стоимость FIFO должны совпадать точно, стоимость по средней — с
+    точностью до AVERAGE_TOLERANCE из-за округления при каждом расходе.
+    """
+    expected = compute_state().valuations
+    stored = {valuation.product_id: valuation for valuation in ProductValuation.objects.all()}
+
+    mismatches = []
+    for product_id in sorted(set(expected) | set(stored)):
+        current = stored.get(product_id) or ProductValuation(product_id=product_id)
+        rebuilt = expected.get(product_id) or ProductValuation(product_id=product_id)
+        if current.quantity != rebuilt.quantity:
+            mismatches.append((product_id, 'quantity', current.quantity, rebuilt.quantity))
+        if current.fifo_value != rebuilt.fifo_value:
+            mismatches.append((product_id, 'fifo_value', current.fifo_value, rebuilt.fifo_value))
+        if abs(current.average_value - rebuilt.average_value) > AVERAGE_TOLERANCE:
+            mismatches.append((product_id, 'average_value', current.average_value, rebuilt.average_value))
+    return mismatches
@@ -1,12 +1,25 @@
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum
 from django.db import transaction
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET, require_POST, conditional_page
 from .models import Product, StockTransaction, Category, Supplier, PurchaseInvoice, PurchaseInvoiceItem
-from .forms import ProductForm, StockTransactionForm, CategoryForm, SupplierForm, PurchaseInvoiceForm, PurchaseInvoiceItemFormSet
+from .ledger import apply_transactions, InsufficientStock
+from .search import search_products
+from .pagination import keyset_paginate, approximate_count
+from users.view_cache import render_cached
+from .imports import import_products, read_rows, CatalogImportError
+from .batches import process_stock_batch
+from .forms import ProductImportForm, ProductForm, StockTransactionForm, CategoryForm, SupplierForm, PurchaseInvoiceForm, PurchaseInvoiceItemFormSet
+
+LOOKUP_PAGE_SIZE = 20
+
 
 def is_admin(user):
     return user.is_authenticated and user.role == 'admin'
@@ -24,17 +37,13 @@ def product_list(request):
     products = Product.objects.all()
 
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(sku__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+        products = search_products(products, search_query)
 
     if category_filter:
         products = products.filter(category_id=category_filter)
 
     if low_stock_filter:
-        products = products.filter(quantity__lte=models.F('min_stock'))
+        products = products.filter(low_stock=True)
 
     paginator = Paginator(products, 10)
     page_number = request.GET.get('page')
@@ -53,6 +62,31 @@ def product_list(request):
     return render(request, 'products/product_list.html', context)
 
 
+@login_required
+@require_GET
+@cache_control(private=True, no_cache=True)
+@conditional_page
+def product_lookup(request):
+    """Поиск товаров для автодополнения в накладных"""
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    products = Product.objects.all()
+    products = search_products(products, query) if query else products.order_by('name')
+
+    offset = (page - 1) * LOOKUP_PAGE_SIZE
+    rows = list(products.values('id', 'name', 'sku', 'price', 'quantity', 'unit')[offset:offset + LOOKUP_PAGE_SIZE + 1])
+
+    return JsonResponse({
+        'results': [{**row, 'price': float(row['price'])} for row in rows[:LOOKUP_PAGE_SIZE]],
+        'page': page,
+        'has_more': len(rows) > LOOKUP_PAGE_SIZE,
+    })
+
+
 @login_required
 @user_passes_test(is_admin_or_manager)
 def product_create(request):
@@ -70,6 +104,30 @@ def product_create(request):
     return render(request, 'products/product_form.html', {'form': form, 'title': 'Создать товар'})
 
 
+@login_required
+@user_passes_test(is_admin_or_manager)
+def product_import(request):
+    """Загрузка каталога товаров из CSV или XLSX"""
+    result = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = import_products(read_rows(upload, upload.name), user=request.user)
+            except CatalogImportError as e:
+                form.add_error('file', str(e))
+            else:
+                messages.success(
+                    request,
+                    f'Загрузка завершена: создано {result.created}, обновлено {result.updated}, ошибок {result.error_count}'
+                )
+    else:
+        form = ProductImportForm()
+
+    return render(request, 'products/product_import.html', {'form': form, 'result': result})
+
+
 @login_required
 @user_passes_test(is_admin_or_manager)
 def product_update(request, pk):
@@ -106,21 +164,11 @@ def stock_transaction(request):
     if request.method == 'POST':
         form = StockTransactionForm(request.POST)
         if form.is_valid():
-            transaction = form.save(commit=False)
-            transaction.user = request.user
-
-            product = transaction.product
-            if transaction.transaction_type == 'in':
-                product.quantity += transaction.quantity
-            else:
-                if product.quantity >= transaction.quantity:
-                    product.quantity -= transaction.quantity
-                else:
-                    messages.error(request, 'Недостаточно товара на складе')
-                    return render(request, 'products/stock_transaction.html', {'form': form})
-
-            product.save()
-            transaction.save()
+            try:
+                apply_transactions([form.save(commit=False)], request.user)
+            except InsufficientStock:
+                messages.error(request, 'Недостаточно товара на складе')
+                return render(request, 'products/stock_transaction.html', {'form': form})
 
             messages.success(request, 'Операция успешно выполнена!')
             return redirect('products:list')
@@ -131,17 +179,30 @@ def stock_transaction(request):
 
 
 @login_required
-def transaction_history(request):
-    transactions = StockTransaction.objects.all().select_related('product', 'user')
-    return render(request, 'products/transaction_history.html', {'transactions': transactions})
+@user_passes_test(is_admin_or_manager)
+@require_POST
+def stock_batch(request):
+    """Пакетное проведение операций по складу для сканеров и интеграций (JSON)"""
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'error': 'Некорректный JSON'}, status=400)
+
+    result = process_stock_batch(request.user, payload, request.headers.get('Idempotency-Key', '').strip())
+    response = JsonResponse(result.body, status=result.status_code)
+    if result.replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
 
 
 @login_required
 @user_passes_test(is_admin_or_manager)
 def supplier_list(request):
     """Список поставщиков"""
-    suppliers = Supplier.objects.all().order_by('name')
-    return render(request, 'products/supplier_list.html', {'suppliers': suppliers})
+    return render_cached(
+        request, 'supplier_list', 'products/supplier_list.html', 'Список поставщиков',
+        lambda: {'suppliers': Supplier.objects.all().order_by('name')}
+    )
 
 
 @login_required
@@ -186,11 +247,7 @@ def purchase_invoice_create(request):
                     invoice.created_by = request.user
                     invoice.save()
 
-                    instances = formset.save(commit=False)
-                    for instance in instances:
-                        instance.invoice = invoice
-                        instance.save()
-
+                    invoice.add_items(formset.save(commit=False))
 
                     for instance in formset.deleted_objects:
                         instance.delete()
@@ -201,11 +258,7 @@ def purchase_invoice_create(request):
             except Exception as e:
                 messages.error(request, f'Ошибка при создании накладной: {str(e)}')
     else:
-
-        last_invoice = PurchaseInvoice.objects.order_by('-id').first()
-        next_number = f"ПР-{(last_invoice.id + 1) if last_invoice else 1:06d}" if last_invoice else "ПР-000001"
-
-        form = PurchaseInvoiceForm(initial={'invoice_number': next_number})
+        form = PurchaseInvoiceForm()
         formset = PurchaseInvoiceItemFormSet()
 
     return render(request, 'products/purchase_invoice_form.html', {
@@ -234,28 +287,31 @@ def purchase_invoice_complete(request, pk):
     """Завершение накладной - увеличение остатков"""
     invoice = get_object_or_404(PurchaseInvoice, pk=pk)
 
-    if invoice.status != 'draft':
-        messages.error(request, 'Накладная уже обработана или отменена!')
-        return redirect('products:purchase_invoice_detail', pk=pk)
-
     try:
         with transaction.atomic():
-
-            for item in invoice.purchaseinvoiceitem_set.all():
-                product = item.product
-                product.quantity += item.quantity
-                product.save()
-
-                StockTransaction.objects.create(
-                    product=product,
-                    transaction_type='in',
-                    quantity=item.quantity,
-                    user=request.user,
-                    comment=f'Приход по накладной {invoice.invoice_number}'
-                )
-
-            invoice.status = 'completed'
-            invoice.save()
+            # Условный UPDATE не дает провести накладную дважды при параллельных запросах
+            now = timezone.now()
+            if not PurchaseInvoice.objects.filter(pk=pk, status='draft').update(
+                status='completed', updated_at=now, completed_at=now
+            ):
+                messages.error(request, 'Накладная уже обработана или отменена!')
+                return redirect('products:purchase_invoice_detail', pk=pk)
+
+            apply_transactions(
+                (
+                    StockTransaction(
+                        product_id=product_id,
+                        transaction_type='in',
+                        quantity=quantity,
+                        unit_cost=purchase_price,
+                        comment=f'Приход по накладной {invoice.invoice_number}'
+                    )
+                    for product_id, quantity, purchase_price in invoice.purchaseinvoiceitem_set.values_list(
+                        'product_id', 'quantity', 'purchase_price'
+                    )
+                ),
+                request.user
+            )
 
         messages.success(request, 'Накладная успешно завершена! Остатки обновлены.')
 
@@ -305,14 +361,19 @@ def transaction_history(request):
 
     if transaction_type:
         transactions = transactions.filter(transaction_type=transaction_type)
-    paginator = Paginator(transactions, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+
+    page_obj = keyset_paginate(transactions, request.GET.get('cursor'), 20)
+    total_count, total_capped = approximate_count(transactions)
+    filter_query = request.GET.copy()
+    filter_query.pop('cursor', None)
     products = Product.objects.all()
     users = get_user_model().objects.filter(stocktransaction__isnull=False).distinct()
 
     context = {
         'transactions': page_obj,
+        'total_count': total_count,
+        'total_capped': total_capped,
+        'filter_query': filter_query.urlencode(),
         'products': products,
         'users': users,
         'product_filter': product_filter,
@@ -0,0 +1,25 @@
+from django import forms
+from django.urls import reverse_lazy
+
+
+class ProductLookupSelect(forms.Select):
+    """Выбор товара без вывода всего каталога.
+
+    В HTML попадает только выбранный товар, остальные варианты страница
+    подгружает из products:lookup по мере ввода (static/js/product_lookup.js).
+    """
+
+    def __init__(self, attrs=None):
+        attrs = {'data-lookup-url': reverse_lazy('products:lookup'), **(attrs or {})}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        default = (None, [], 0)
+        selected_values = {str(v) for v in value if str(v) not in self.choices.field.empty_values}
+        default[1].append(self.create_option(name, '', self.choices.field.empty_label or '', not selected_values, 0))
+
+        for index, product in enumerate(self.choices.queryset.filter(pk__in=selected_values), 1):
+            default[1].append(self.create_option(
+                name, product.pk, self.choices.field.label_from_instance(product), True, index
+            ))
+        return [default]
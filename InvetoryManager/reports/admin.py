@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import ExportJob, StockSnapshot
 
-# Register your models here.
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['report', 'status', 'progress', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['report', 'status', 'created_at']
+    readonly_fields = ['created_at', 'finished_at']
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['day', 'created_at']
+    date_hierarchy = 'day'
+    readonly_fields = ['day', 'created_at']
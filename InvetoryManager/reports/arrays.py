@@ -0,0 +1,17 @@
+import numpy as np
+
+
+def align_to_products(product_ids, data):
+    """Позиции строк data в отсортированном массиве product_ids.
+
+    Первый столбец data — id товара. Возвращает (positions, data) только для
+    строк, чей товар есть в product_ids: товары, созданные после чтения
+    списка, пропускаются.
+    """
+    size = len(product_ids)
+    positions = np.searchsorted(product_ids, data[:, 0])
+    if size:
+        known = product_ids[np.minimum(positions, size - 1)] == data[:, 0]
+    else:
+        known = np.zeros(len(data), dtype=bool)
+    return positions[known], data[known]
@@ -0,0 +1,149 @@
+from datetime import timedelta
+import numpy as np
+from django.db.models import F, Sum
+from django.utils import timezone
+from products.models import Product
+from users import view_cache
+from .arrays import align_to_products
+from .models import DailyStockMovement
+
+PERIOD_CHOICES = (90, 180, 365)
+DEFAULT_PERIOD = 365
+# Границы ABC по доле в стоимости расхода нарастающим итогом
+ABC_THRESHOLDS = (0.8, 0.95)
+# Границы XYZ по коэффициенту вариации недельного расхода
+XYZ_THRESHOLDS = (0.5, 1.0)
+CLASSES = ('A', 'B', 'C')
+VARIABILITY_CLASSES = ('X', 'Y', 'Z')
+
+
+class Classification:
+    """ABC/XYZ-классы всех товаров: массивы, выровненные по product_ids"""
+
+    def __init__(self, start, end, product_ids, category_ids, price, quantity, value, share, variation, abc, xyz):
+        self.start = start
+        self.end = end
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.price = price
+        self.quantity = quantity
+        self.value = value
+        self.share = share
+        self.variation = variation
+        self.abc = abc
+        self.xyz = xyz
+
+    def row(self, position):
+        variation = self.variation[position]
+        return {
+            'product_id': int(self.product_ids[position]),
+            'quantity': int(self.quantity[position]),
+            'price': float(self.price[position]),
+            'value': float(self.value[position]),
+            'share': float(self.share[position]) * 100,
+            'variation': None if np.isinf(variation) else float(variation),
+            'abc': str(self.abc[position]),
+            'xyz': str(self.xyz[position]),
+        }
+
+
+def period_days(params):
+    try:
+        days = int(params.get('period', DEFAULT_PERIOD))
+    except (TypeError, ValueError):
+        return DEFAULT_PERIOD
+    return days if days in PERIOD_CHOICES else DEFAULT_PERIOD
+
+
+def classify(days=DEFAULT_PERIOD, today=None):
+    """ABC по стоимости расхода и XYZ по вариации спроса за последние days дней.
+
+    Расход и сумма квадратов дневного расхода считаются одной
+    группировкой дневных итогов по товарам, дальше все товары
+    обрабатываются массивами NumPy. Стоимость расхода — количество по
+    текущей цене товара. Товары сортируются по стоимости, класс A получают
+    товары, набирающие первые 80% стоимости, B — следующие 15%, остальные
+    и товары без расхода — C. Вариация недельного расхода оценивается по
+    дневной как CV / sqrt(7) (дни считаются независимыми); дни без
+    расхода входят в расчет, для товаров моложе периода берутся дни с
+    момента создания. У товаров без расхода вариация бесконечна (Z).
+    """
+    end = today or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+
+    products = list(Product.objects.order_by('pk').values_list('pk', 'category_id', 'price', 'created_at'))
+    product_ids = np.array([product[0] for product in products], dtype=np.int64)
+    category_ids = np.array([product[1] or 0 for product in products], dtype=np.int64)
+    price = np.array([float(product[2]) for product in products])
+    age = np.array([(end - timezone.localdate(product[3])).days + 1 for product in products], dtype=np.int64)
+
+    rows = DailyStockMovement.objects.filter(
+        transaction_type='out', day__range=[start, end]
+    ).order_by().values('product_id').annotate(
+        total=Sum('quantity'),
+        total_squares=Sum(F('quantity') * F('quantity')),
+    ).values_list('product_id', 'total', 'total_squares')
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+
+    size = len(product_ids)
+    positions, data = align_to_products(product_ids, data)
+
+    quantity = np.zeros(size, dtype=np.int64)
+    squares = np.zeros(size)
+    quantity[positions] = data[:, 1]
+    squares[positions] = data[:, 2]
+
+    value = quantity * price
+    order = np.argsort(-value, kind='stable')
+    total_value = value.sum()
+    share = np.zeros(size)
+    if total_value > 0:
+        share[order] = np.cumsum(value[order]) / total_value
+    share_before = share - (value / total_value if total_value > 0 else 0)
+    abc = np.array(CLASSES)[np.searchsorted(ABC_THRESHOLDS, share_before, side='right')]
+    abc[value <= 0] = 'C'
+
+    history = np.clip(age, 1, days)
+    mean = quantity / history
+    variance = np.maximum(squares / history - mean * mean, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variation = np.where(mean > 0, np.sqrt(variance) / mean / np.sqrt(7), np.inf)
+    xyz = np.array(VARIABILITY_CLASSES)[np.searchsorted(XYZ_THRESHOLDS, variation, side='left')]
+
+    return Classification(start, end, product_ids, category_ids, price, quantity, value, share, variation, abc, xyz)
+
+
+def cached_classification(days=DEFAULT_PERIOD):
+    """classify с кешем, который сбрасывается новыми операциями и изменением товаров"""
+    return view_cache.cached_value(
+        f'abc_xyz:{days}:{timezone.localdate().isoformat()}',
+        ('products', 'stock'),
+        lambda: classify(days),
+    )
+
+
+def select_positions(classification, category_id=None, abc='', xyz=''):
+    """Позиции товаров по фильтру в порядке убывания стоимости расхода"""
+    mask = np.ones(len(classification.product_ids), dtype=bool)
+    if category_id:
+        mask &= classification.category_ids == int(category_id)
+    if abc in CLASSES:
+        mask &= classification.abc == abc
+    if xyz in VARIABILITY_CLASSES:
+        mask &= classification.xyz == xyz
+    positions = np.flatnonzero(mask)
+    return positions[np.argsort(-classification.value[positions], kind='stable')]
+
+
+def class_matrix(classification, positions):
+    """Число товаров в каждой паре классов: [(класс ABC, [(класс XYZ, число), ...]), ...]"""
+    return [
+        (
+            abc,
+            [
+                (xyz, int(((classification.abc[positions] == abc) & (classification.xyz[positions] == xyz)).sum()))
+                for xyz in VARIABILITY_CLASSES
+            ],
+        )
+        for abc in CLASSES
+    ]
@@ -0,0 +1,162 @@
+import openpyxl
+from products.models import Product
+from . import classification, queries
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Sheet:
+    """Описание листа выгрузки: заголовок, шапка и ленивый источник строк"""
+
+    def __init__(self, title, headers, rows, count=None):
+        self.title = title
+        self.headers = headers
+        self.rows = rows
+        self.count = count
+
+
+def write_workbook(sheets, fileobj, progress=None):
+    """Запись листов в xlsx в режиме write-only: строки не держатся в памяти.
+
+    Память ограничена при любом числе строк, но файл не отдается по частям:
+    xlsx — zip-архив, и openpyxl собирает его из листов только в save(),
+    поэтому первый байт появляется после записи последней строки (замер —
+    manage.py benchmark_export). Отсюда выгрузка в фоновом задании, а не в
+    запросе.
+
+    progress, если передан, вызывается с числом записанных строк и общим
+    числом строк после каждой порции из EXPORT_CHUNK_SIZE строк.
+    """
+    total = sum(sheet.count() for sheet in sheets if sheet.count) if progress else 0
+    written = 0
+
+    workbook = openpyxl.Workbook(write_only=True)
+    for sheet in sheets:
+        worksheet = workbook.create_sheet(sheet.title)
+        worksheet.append(sheet.headers)
+        for row in sheet.rows:
+            worksheet.append(row)
+            written += 1
+            if progress and written % EXPORT_CHUNK_SIZE == 0:
+                progress(written, total)
+    workbook.save(fileobj)
+
+
+def stock_sheets(products):
+    count = products.count
+    products = products.select_related('category').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = (
+        [
+            product.sku,
+            product.name,
+            str(product.category) if product.category else '',
+            product.get_unit_display(),
+            float(product.price),
+            product.quantity,
+            product.min_stock,
+            "Низкий запас" if product.low_stock else "Норма",
+        ]
+        for product in products
+    )
+    headers = ['Артикул', 'Наименование', 'Категория', 'Ед. изм.', 'Цена', 'Текущий остаток', 'Мин. запас', 'Статус']
+    return [Sheet("Остатки товаров", headers, rows, count)]
+
+
+def movement_sheets(transactions):
+    count = transactions.count
+    transactions = transactions.select_related('product', 'user').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    rows = (
+        [
+            transaction.date.strftime("%d.%m.%Y %H:%M"),
+            transaction.product.name,
+            transaction.product.sku,
+            transaction.get_transaction_type_display(),
+            transaction.quantity,
+            str(transaction.user),
+            transaction.comment,
+        ]
+        for transaction in transactions
+    )
+    headers = ['Дата', 'Товар', 'Артикул', 'Тип операции', 'Количество', 'Пользователь', 'Комментарий']
+    return [Sheet("Движение товаров", headers, rows, count)]
+
+
+def turnover_sheets(popular_products, inactive_products):
+    popular_rows = (
+        [
+            product['product__name'],
+            product['product__sku'],
+            product['total_quantity'],
+            product['transaction_count'],
+        ]
+        for product in popular_products
+    )
+    count = inactive_products.count
+    inactive_products = inactive_products.select_related('category').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    inactive_rows = (
+        [
+            product.name,
+            product.sku,
+            str(product.category) if product.category else '',
+            product.quantity,
+        ]
+        for product in inactive_products
+    )
+    return [
+        Sheet("Популярные товары", ['Товар', 'Артикул', 'Количество продаж', 'Количество операций'], popular_rows),
+        Sheet("Товары без движения", ['Товар', 'Артикул', 'Категория', 'Текущий остаток'], inactive_rows, count),
+    ]
+
+
+def abc_xyz_sheets(result, positions):
+    def rows():
+        for offset in range(0, len(positions), EXPORT_CHUNK_SIZE):
+            chunk = [result.row(position) for position in positions[offset:offset + EXPORT_CHUNK_SIZE]]
+            products = Product.objects.select_related('category').in_bulk([row['product_id'] for row in chunk])
+            for row in chunk:
+                product = products.get(row['product_id'])
+                if product is None:
+                    continue
+                yield [
+                    product.sku,
+                    product.name,
+                    str(product.category) if product.category else '',
+                    row['quantity'],
+                    row['price'],
+                    round(row['value'], 2),
+                    round(row['share'], 2),
+                    round(row['variation'], 3) if row['variation'] is not None else '',
+                    row['abc'] + row['xyz'],
+                ]
+
+    headers = ['Артикул', 'Наименование', 'Категория', 'Расход', 'Цена', 'Стоимость расхода', 'Доля нарастающим итогом, %', 'Коэффициент вариации', 'Класс']
+    return [Sheet("ABC-XYZ анализ", headers, rows(), lambda: len(positions))]
+
+
+def report_sheets(report, params):
+    """Листы выгрузки для отчета по сохраненным фильтрам"""
+    if report == 'stock':
+        return stock_sheets(queries.stock_queryset(params))
+    if report == 'movement':
+        return movement_sheets(queries.movement_queryset(params))
+    if report == 'turnover':
+        start_date, end_date = queries.turnover_period(params)
+        popular_products = list(queries.turnover_by_type('out', start_date, end_date)[:10])
+        inactive_products = queries.inactive_products(params, start_date, end_date)
+        return turnover_sheets(popular_products, inactive_products)
+    if report == 'abc_xyz':
+        result = classification.cached_classification(classification.period_days(params))
+        category = params.get('category', '')
+        positions = classification.select_positions(
+            result, category if category.isdigit() else None, params.get('abc', ''), params.get('xyz', '')
+        )
+        return abc_xyz_sheets(result, positions)
+    raise ValueError(f'Неизвестный отчет: {report}')
+
+
+def report_filename(report, params):
+    if report == 'turnover':
+        return f"turnover_report_{params.get('period', '30')}d.xlsx"
+    if report == 'abc_xyz':
+        return f"abc_xyz_report_{classification.period_days(params)}d.xlsx"
+    return f'{report}_report.xlsx'
@@ -0,0 +1,212 @@
+from datetime import timedelta
+import numpy as np
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, When, F, Sum
+from django.utils import timezone
+from products.models import Product
+from users import dashboard, view_cache
+from .arrays import align_to_products
+from .models import DailyStockMovement
+
+HISTORY_DAYS = 365
+RECENT_DAYS = 28
+LEAD_TIME_DAYS = 7
+COVER_DAYS = 14
+# Коэффициент страхового запаса: 1.65 соответствует уровню сервиса около 95%
+SERVICE_FACTOR = 1.65
+DEMAND_CACHE_TIMEOUT = 24 * 60 * 60
+UPDATE_BATCH_SIZE = 2000
+
+
+class DemandStats:
+    """Статистика расхода по всем товарам: массивы, выровненные по product_ids"""
+
+    def __init__(self, product_ids, category_ids, average_demand, recent_demand, demand_std):
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.average_demand = average_demand
+        self.recent_demand = recent_demand
+        self.demand_std = demand_std
+
+
+class Forecast:
+    """Рекомендации по запасу для всех товаров"""
+
+    def __init__(self, stats, quantity, min_stock, days_of_cover, reorder_point, order_quantity):
+        self.stats = stats
+        self.product_ids = stats.product_ids
+        self.quantity = quantity
+        self.min_stock = min_stock
+        self.days_of_cover = days_of_cover
+        self.reorder_point = reorder_point
+        self.order_quantity = order_quantity
+
+    def row(self, position):
+        days_of_cover = self.days_of_cover[position]
+        return {
+            'product_id': int(self.product_ids[position]),
+            'quantity': int(self.quantity[position]),
+            'min_stock': int(self.min_stock[position]),
+            'average_demand': float(self.stats.average_demand[position]),
+            'recent_demand': float(self.stats.recent_demand[position]),
+            'demand_std': float(self.stats.demand_std[position]),
+            'days_of_cover': None if np.isinf(days_of_cover) else float(days_of_cover),
+            'reorder_point': int(self.reorder_point[position]),
+            'order_quantity': int(self.order_quantity[position]),
+        }
+
+
+def compute_demand(today=None, history_days=HISTORY_DAYS, recent_days=RECENT_DAYS):
+    """Средний дневной расход, расход за последние дни и его разброс.
+
+    Суммы расхода, суммы квадратов и расход за последние дни считаются
+    одной группировкой дневных итогов по товарам (покрывающий индекс
+    таблицы итогов), дальше все товары обрабатываются массивами NumPy.
+    Дни без расхода считаются нулевыми; для товаров моложе периода берутся
+    только дни с момента создания. Сегодняшний неполный день не
+    учитывается.
+    """
+    today = today or timezone.localdate()
+    end = today - timedelta(days=1)
+    start = end - timedelta(days=history_days - 1)
+    recent_start = end - timedelta(days=recent_days - 1)
+
+    products = list(Product.objects.order_by('pk').values_list('pk', 'category_id', 'created_at'))
+    product_ids = np.array([pk for pk, category_id, created_at in products], dtype=np.int64)
+    category_ids = np.array([category_id or 0 for pk, category_id, created_at in products], dtype=np.int64)
+    age = np.array([(end - timezone.localdate(created_at)).days + 1 for pk, category_id, created_at in products])
+
+    rows = DailyStockMovement.objects.filter(
+        transaction_type='out', day__range=[start, end]
+    ).order_by().values('product_id').annotate(
+        total=Sum('quantity'),
+        total_squares=Sum(F('quantity') * F('quantity')),
+        recent_total=Sum(Case(When(day__gte=recent_start, then='quantity'), default=0)),
+    ).values_list('product_id', 'total', 'total_squares', 'recent_total')
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 4)
+
+    size = len(product_ids)
+    positions, data = align_to_products(product_ids, data)
+
+    total = np.zeros(size)
+    total_squares = np.zeros(size)
+    recent_total = np.zeros(size)
+    total[positions] = data[:, 1]
+    total_squares[positions] = data[:, 2]
+    recent_total[positions] = data[:, 3]
+
+    history = np.clip(age, 1, history_days)
+    average = total / history
+    variance = np.maximum(total_squares / history - average * average, 0)
+
+    return DemandStats(
+        product_ids=product_ids,
+        category_ids=category_ids,
+        average_demand=average,
+        recent_demand=recent_total / np.clip(age, 1, recent_days),
+        demand_std=np.sqrt(variance),
+    )
+
+
+def _demand_cache_key(today, history_days, recent_days):
+    return f'reports:demand:{today.isoformat()}:{history_days}:{recent_days}'
+
+
+def cached_demand(history_days=HISTORY_DAYS, recent_days=RECENT_DAYS):
+    """compute_demand с кешем до конца дня: история до вчера за день не меняется.
+
+    Товары, созданные сегодня, попадают в статистику со следующего дня.
+    """
+    today = timezone.localdate()
+    key = _demand_cache_key(today, history_days, recent_days)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_demand(today, history_days, recent_days)
+        cache.set(key, stats, DEMAND_CACHE_TIMEOUT)
+    return stats
+
+
+def recommend(stats, lead_time_days=LEAD_TIME_DAYS, cover_days=COVER_DAYS, service_factor=SERVICE_FACTOR):
+    """Точка заказа и объем заказа по текущим остаткам.
+
+    Прогноз дневного расхода — скользящее среднее за последние дни.
+    Точка заказа: расход за срок поставки плюс страховой запас
+    service_factor * sigma * sqrt(срок поставки). Если остаток не выше
+    точки заказа, рекомендуется дозаказать до точки заказа плюс расход на
+    cover_days дней.
+    """
+    current = {
+        pk: (quantity, min_stock)
+        for pk, quantity, min_stock in Product.objects.values_list('pk', 'quantity', 'min_stock').iterator(chunk_size=UPDATE_BATCH_SIZE)
+    }
+    product_ids = stats.product_ids.tolist()
+    quantity = np.array([current.get(pk, (0, 0))[0] for pk in product_ids], dtype=np.int64)
+    min_stock = np.array([current.get(pk, (0, 0))[1] for pk in product_ids], dtype=np.int64)
+
+    demand = stats.recent_demand
+    safety_stock = service_factor * stats.demand_std * np.sqrt(lead_time_days)
+    reorder_point = np.ceil(demand * lead_time_days + safety_stock - 1e-9).astype(np.int64)
+    target = np.ceil(reorder_point + demand * cover_days - 1e-9).astype(np.int64)
+    order_quantity = np.where(quantity <= reorder_point, np.maximum(target - quantity, 0), 0)
+    order_quantity[demand == 0] = 0
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(demand > 0, quantity / demand, np.inf)
+
+    return Forecast(stats, quantity, min_stock, days_of_cover, reorder_point, order_quantity)
+
+
+def select_positions(forecast, category_id=None, reorder_only=False):
+    """Позиции товаров по фильтру, от меньшего запаса в днях к большему"""
+    mask = np.ones(len(forecast.product_ids), dtype=bool)
+    if category_id:
+        mask &= forecast.stats.category_ids == int(category_id)
+    if reorder_only:
+        mask &= forecast.order_quantity > 0
+    positions = np.flatnonzero(mask)
+    return positions[np.argsort(forecast.days_of_cover[positions], kind='stable')]
+
+
+def changed_positions(forecast, positions=None):
+    """Позиции товаров, у которых apply_min_stock изменит минимальный запас.
+
+    Товары без расхода за период пропускаются: нулевая точка заказа стерла
+    бы минимальный запас, заданный вручную, и отключила бы уведомления о
+    низком запасе.
+    """
+    if positions is None:
+        positions = np.arange(len(forecast.product_ids))
+    positions = np.asarray(positions)
+    reorder_point = forecast.reorder_point[positions]
+    return positions[(reorder_point > 0) & (reorder_point != forecast.min_stock[positions])]
+
+
+def apply_min_stock(forecast, positions=None):
+    """Запись точек заказа в min_stock одним UPDATE через executemany.
+
+    Обновляются только товары из changed_positions. Счетчик низкого запаса
+    на главной и кеш страниц сбрасываются. Возвращает число обновленных
+    товаров.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    updates = [
+        (int(forecast.reorder_point[position]), now, int(forecast.product_ids[position]))
+        for position in changed_positions(forecast, positions)
+    ]
+    if not updates:
+        return 0
+
+    sql = 'UPDATE {table} SET {min_stock} = %s, {updated_at} = %s WHERE {id} = %s'.format(
+        table=connection.ops.quote_name(Product._meta.db_table),
+        min_stock=connection.ops.quote_name('min_stock'),
+        updated_at=connection.ops.quote_name('updated_at'),
+        id=connection.ops.quote_name('id'),
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for offset in range(0, len(updates), UPDATE_BATCH_SIZE):
+                cursor.executemany(sql, updates[offset:offset + UPDATE_BATCH_SIZE])
+        dashboard.invalidate('low_stock_count')
+        view_cache.invalidate('products')
+    return len(updates)
@@ -0,0 +1,78 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction, close_old_connections
+from django.urls import reverse
+from django.utils import timezone
+from notifications.models import Notification
+from .exports import write_workbook, report_sheets, report_filename
+from .models import ExportJob
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2),
+            thread_name_prefix='export-job'
+        )
+    return _executor
+
+
+def create_export_job(user, report, params):
+    """Создание задания на выгрузку и постановка его в очередь после коммита"""
+    job = ExportJob.objects.create(created_by=user, report=report, params=params)
+    if getattr(settings, 'EXPORT_JOB_WORKERS', 2) > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+    return job
+
+
+def _run_in_thread(job_pk):
+    close_old_connections()
+    try:
+        run_export_job(job_pk)
+    finally:
+        close_old_connections()
+
+
+def run_export_job(job_pk):
+    """Выполнение задания: файл сохраняется в EXPORT_ROOT, автор получает уведомление"""
+    claimed = ExportJob.objects.filter(pk=job_pk, status='pending').update(status='running')
+    if not claimed:
+        return
+
+    job = ExportJob.objects.get(pk=job_pk)
+
+    def progress(written, total):
+        if total:
+            percent = min(99, written * 100 // total)
+            ExportJob.objects.filter(pk=job_pk).update(progress=percent)
+
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            write_workbook(report_sheets(job.report, job.params), tmp, progress=progress)
+            tmp.seek(0)
+            job.file.save(report_filename(job.report, job.params), File(tmp), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return
+
+    job.status = 'done'
+    job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'progress', 'finished_at'])
+
+    Notification.objects.create(
+        user=job.created_by,
+        title='Выгрузка отчета готова',
+        message=f'Файл "{job.get_report_display()}" готов к скачиванию: {reverse("reports:export_job_list")}',
+        notification_type='system',
+        related_object_id=job.id,
+        related_object_type='export_job'
+    )
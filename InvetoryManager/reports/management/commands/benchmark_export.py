@@ -0,0 +1,95 @@
+import tempfile
+import time
+import tracemalloc
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from products.models import Product, StockTransaction
+from reports.exports import movement_sheets, write_workbook
+from reports.queries import movement_queryset
+
+BATCH_SIZE = 5000
+
+
+class _TimedFile:
+    """Файл, запоминающий время первой записи"""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self.first_write = None
+
+    def write(self, data):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        return self._fileobj.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+class Command(BaseCommand):
+    help = ('Замер выгрузки движения товаров в xlsx: пиковая память, время до первого байта и общее время. '
+            'Тестовые операции создаются в транзакции, которая откатывается после замера')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='Число операций в выгрузке')
+        parser.add_argument('--products', type=int, default=1000, help='Число товаров, по которым создаются операции')
+        parser.add_argument('--skip-memory', action='store_true',
+                            help='Не замерять память: замер идет отдельным проходом под tracemalloc, который в разы медленнее')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['products'] < 1:
+            raise CommandError('Число операций и товаров должно быть больше 0')
+
+        with transaction.atomic():
+            self._create_data(options['rows'], options['products'])
+            self._measure_time()
+            if not options['skip_memory']:
+                self._measure_memory()
+            transaction.set_rollback(True)
+
+    def _create_data(self, rows, product_count):
+        user = get_user_model().objects.create_user(
+            email='benchmark@example.com', username='benchmark-export', password=None
+        )
+        products = Product.objects.bulk_create([
+            Product(name=f'Товар {index}', sku=f'BENCH-{index:06d}', price=10, quantity=0)
+            for index in range(product_count)
+        ])
+        for offset in range(0, rows, BATCH_SIZE):
+            StockTransaction.objects.bulk_create([
+                StockTransaction(
+                    product=products[index % product_count],
+                    transaction_type='in' if index % 2 else 'out',
+                    quantity=index % 50 + 1,
+                    user=user,
+                    comment='Замер выгрузки',
+                )
+                for index in range(offset, min(offset + BATCH_SIZE, rows))
+            ])
+        self.stdout.write(f'Создано операций: {rows}')
+
+    def _export(self, fileobj):
+        write_workbook(movement_sheets(movement_queryset({})), fileobj)
+
+    def _measure_time(self):
+        with tempfile.TemporaryFile() as tmp:
+            output = _TimedFile(tmp)
+            started = time.perf_counter()
+            self._export(output)
+            finished = time.perf_counter()
+            size = tmp.tell()
+
+        self.stdout.write(f'Размер файла: {size / 1024 / 1024:.1f} МБ')
+        self.stdout.write(f'Время до первого байта: {output.first_write - started:.2f} с')
+        self.stdout.write(f'Общее время: {finished - started:.2f} с')
+
+    def _measure_memory(self):
+        tracemalloc.start()
+        try:
+            with tempfile.TemporaryFile() as tmp:
+                self._export(tmp)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.stdout.write(f'Пиковая память Python: {peak / 1024 / 1024:.1f} МБ')
@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from reports.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Снимки остатков на конец дня; без параметров снимается вчерашний день'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Построить снимки начиная с даты (ГГГГ-ММ-ДД)')
+        parser.add_argument('--to', dest='date_to', help='Последний день снимков (ГГГГ-ММ-ДД), по умолчанию вчера')
+        parser.add_argument('--step', type=int, default=1, help='Шаг между снимками в днях')
+
+    def _parse(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+    def handle(self, *args, **options):
+        if options['step'] < 1:
+            raise CommandError('Шаг должен быть не меньше 1')
+
+        date_to = self._parse(options['date_to']) if options['date_to'] else None
+        if options['date_from']:
+            date_from = self._parse(options['date_from'])
+        else:
+            date_from = date_to or timezone.localdate() - timedelta(days=1)
+
+        created = build_snapshots(date_from, date_to, options['step'])
+        self.stdout.write(self.style.SUCCESS(f'Построено снимков: {created}'))
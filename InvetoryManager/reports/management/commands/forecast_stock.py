@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from reports.forecast import (
+    compute_demand, recommend, apply_min_stock,
+    HISTORY_DAYS, RECENT_DAYS, LEAD_TIME_DAYS, COVER_DAYS, SERVICE_FACTOR
+)
+
+
+class Command(BaseCommand):
+    help = 'Прогноз расхода и рекомендуемые точки заказа по всем товарам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', type=int, default=HISTORY_DAYS, help='Период истории расхода в днях')
+        parser.add_argument('--recent', type=int, default=RECENT_DAYS, help='Период скользящего среднего в днях')
+        parser.add_argument('--lead-time', type=int, default=LEAD_TIME_DAYS, help='Срок поставки в днях')
+        parser.add_argument('--cover-days', type=int, default=COVER_DAYS, help='На сколько дней расхода заказывать сверх точки заказа')
+        parser.add_argument('--service-factor', type=float, default=SERVICE_FACTOR, help='Коэффициент страхового запаса')
+        parser.add_argument('--apply', action='store_true', help='Записать точки заказа в минимальный запас товаров')
+
+    def handle(self, *args, **options):
+        if options['history'] < 1 or not 1 <= options['recent'] <= options['history']:
+            raise CommandError('Период скользящего среднего должен быть от 1 дня до периода истории')
+        if options['lead_time'] < 0 or options['cover_days'] < 0 or options['service_factor'] < 0:
+            raise CommandError('Срок поставки, дни запаса и коэффициент не могут быть отрицательными')
+
+        started = time.monotonic()
+        stats = compute_demand(history_days=options['history'], recent_days=options['recent'])
+        forecast = recommend(stats, options['lead_time'], options['cover_days'], options['service_factor'])
+        elapsed = time.monotonic() - started
+
+        to_order = forecast.order_quantity > 0
+        self.stdout.write(
+            f'Товаров: {len(forecast.product_ids)}, требуют заказа: {int(to_order.sum())}, '
+            f'всего к заказу: {int(forecast.order_quantity.sum())} ед. ({elapsed:.2f} с)'
+        )
+
+        if options['apply']:
+            updated = apply_min_stock(forecast)
+            self.stdout.write(self.style.SUCCESS(f'Минимальный запас обновлен у {updated} товаров'))
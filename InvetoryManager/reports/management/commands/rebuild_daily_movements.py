@@ -0,0 +1,21 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from reports.rollup import rebuild_movements
+
+
+class Command(BaseCommand):
+    help = 'Пересчет дневных итогов движения товаров по истории операций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Пересчитать начиная с даты (ГГГГ-ММ-ДД)')
+
+    def handle(self, *args, **options):
+        date_from = None
+        if options['date_from']:
+            try:
+                date_from = date.fromisoformat(options['date_from'])
+            except ValueError:
+                raise CommandError('Дата должна быть в формате ГГГГ-ММ-ДД')
+
+        created = rebuild_movements(date_from)
+        self.stdout.write(self.style.SUCCESS(f'Записано дневных итогов: {created}'))
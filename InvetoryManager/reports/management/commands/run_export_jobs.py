@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from reports.jobs import run_export_job
+from reports.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = 'Выполнение заданий на выгрузку отчетов, ожидающих в очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Вернуть в очередь задания, прерванные перезапуском сервера')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            ExportJob.objects.filter(status='running').update(status='pending', progress=0)
+
+        job_ids = list(ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True))
+        for job_id in job_ids:
+            run_export_job(job_id)
+
+        self.stdout.write(self.style.SUCCESS(f'Обработано заданий: {len(job_ids)}'))
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_movements(apps, schema_editor):
+    StockTransaction = apps.get_model('products', 'StockTransaction')
+    DailyStockMovement = apps.get_model('reports', 'DailyStockMovement')
+
+    rows = StockTransaction.objects.order_by().annotate(day=TruncDate('date')).values(
+        'product_id', 'day', 'transaction_type'
+    ).annotate(total_quantity=Sum('quantity'), total_count=Count('id'))
+
+    DailyStockMovement.objects.bulk_create(
+        (
+            DailyStockMovement(
+                product_id=row['product_id'], day=row['day'], transaction_type=row['transaction_type'],
+                quantity=row['total_quantity'], operation_count=row['total_count']
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_alter_product_unit'),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('transaction_type', models.CharField(choices=[('in', 'Приход'), ('out', 'Расход')], max_length=3, verbose_name='Тип операции')),
+                ('quantity', models.BigIntegerField(default=0, verbose_name='Количество')),
+                ('operation_count', models.IntegerField(default=0, verbose_name='Число операций')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Дневное движение товара',
+                'verbose_name_plural': 'Дневное движение товаров',
+                'indexes': [models.Index(fields=['day', 'transaction_type'], name='reports_dai_day_41ad62_idx')],
+                'unique_together': {('product', 'day', 'transaction_type')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_movements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_document_sequence'),
+        ('reports', '0002_dailystockmovement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='День')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Снимок остатков',
+                'verbose_name_plural': 'Снимки остатков',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshotLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Остаток')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Товар')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='reports.stocksnapshot', verbose_name='Снимок')),
+            ],
+            options={
+                'verbose_name': 'Строка снимка остатков',
+                'verbose_name_plural': 'Строки снимков остатков',
+                'unique_together': {('snapshot', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_inventory_valuation'),
+        ('reports', '0003_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailystockmovement',
+            index=models.Index(fields=['transaction_type', 'product', 'day', 'quantity'], name='reports_dai_transac_3a7fb5_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_demand_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='report',
+            field=models.CharField(choices=[('stock', 'Остатки товаров'), ('movement', 'Движение товара'), ('turnover', 'Оборот товаров'), ('abc_xyz', 'ABC/XYZ-анализ')], max_length=20, verbose_name='Отчет'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:30
+
+import os
+import shutil
+import uuid
+import reports.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_exports(apps, schema_editor):
+    # Готовые файлы переносятся из публичного MEDIA_ROOT/exports в EXPORT_ROOT
+    # под случайный каталог; отсутствующие файлы отвязываются от задания
+    ExportJob = apps.get_model('reports', 'ExportJob')
+    for job in ExportJob.objects.exclude(file='').iterator():
+        source = os.path.join(settings.MEDIA_ROOT, job.file.name)
+        if not os.path.exists(source):
+            ExportJob.objects.filter(pk=job.pk).update(file='')
+            continue
+        name = f'{uuid.uuid4().hex}/{os.path.basename(job.file.name)}'
+        target = os.path.join(settings.EXPORT_ROOT, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(source, target)
+        ExportJob.objects.filter(pk=job.pk).update(file=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_abc_xyz_export'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, storage=reports.models.export_storage, upload_to=reports.models.export_upload_to, verbose_name='Файл'),
+        ),
+        migrations.RunPython(move_exports, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,104 @@
+import uuid
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.contrib.auth import get_user_model
+from products.models import Product, StockTransaction
 
-# Create your models here.
+User = get_user_model()
+
+
+def export_storage():
+    """Выгрузки лежат в EXPORT_ROOT вне MEDIA_ROOT и отдаются только автору (reports:export_job_download)"""
+    return FileSystemStorage(location=settings.EXPORT_ROOT)
+
+
+def export_upload_to(instance, filename):
+    # Случайный каталог: путь к файлу не угадать по названию отчета
+    return f'{uuid.uuid4().hex}/{filename}'
+
+
+class ExportJob(models.Model):
+    """Фоновая выгрузка отчета в Excel"""
+    REPORT_CHOICES = [
+        ('stock', 'Остатки товаров'),
+        ('movement', 'Движение товара'),
+        ('turnover', 'Оборот товаров'),
+        ('abc_xyz', 'ABC/XYZ-анализ'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    report = models.CharField(max_length=20, choices=REPORT_CHOICES, verbose_name='Отчет')
+    params = models.JSONField(default=dict, blank=True, verbose_name='Фильтры')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %')
+    file = models.FileField(upload_to=export_upload_to, storage=export_storage, blank=True, verbose_name='Файл')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Создал')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата завершения')
+
+    class Meta:
+        verbose_name = 'Выгрузка отчета'
+        verbose_name_plural = 'Выгрузки отчетов'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_report_display()} ({self.get_status_display()})"
+
+
+class DailyStockMovement(models.Model):
+    """Дневной итог движения товара: сумма количества и число операций по типу"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Товар')
+    day = models.DateField(verbose_name='День')
+    transaction_type = models.CharField(max_length=3, choices=StockTransaction.TRANSACTION_TYPES, verbose_name='Тип операции')
+    quantity = models.BigIntegerField(default=0, verbose_name='Количество')
+    operation_count = models.IntegerField(default=0, verbose_name='Число операций')
+
+    class Meta:
+        verbose_name = 'Дневное движение товара'
+        verbose_name_plural = 'Дневное движение товаров'
+        unique_together = ['product', 'day', 'transaction_type']
+        indexes = [
+            models.Index(fields=['day', 'transaction_type']),
+            # Покрывающий индекс для расчета спроса по всем товарам (reports/forecast.py)
+            models.Index(fields=['transaction_type', 'product', 'day', 'quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.day} {self.transaction_type}: {self.quantity}"
+
+
+class StockSnapshot(models.Model):
+    """Снимок остатков на конец дня"""
+    day = models.DateField(unique=True, verbose_name='День')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Снимок остатков'
+        verbose_name_plural = 'Снимки остатков'
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"Остатки на {self.day}"
+
+
+class StockSnapshotLine(models.Model):
+    """Остаток товара в снимке; товары с нулевым остатком не хранятся"""
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, related_name='lines', verbose_name='Снимок')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Товар')
+    quantity = models.IntegerField(verbose_name='Остаток')
+
+    class Meta:
+        verbose_name = 'Строка снимка остатков'
+        verbose_name_plural = 'Строки снимков остатков'
+        unique_together = ['snapshot', 'product']
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity}"
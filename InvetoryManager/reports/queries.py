@@ -0,0 +1,145 @@
+from datetime import datetime, time, timedelta
+from django.db.models import Sum, Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from products.models import Product, StockTransaction, ProductValuation
+from .models import DailyStockMovement
+
+
+def stock_queryset(params):
+    products = Product.objects.all().select_related('category')
+
+    if params.get('category'):
+        products = products.filter(category_id=params['category'])
+
+    if params.get('low_stock'):
+        products = products.filter(low_stock=True)
+
+    return products
+
+
+def report_summary(queryset, **metrics):
+    """Сводные показатели отчета одним запросом.
+
+    Значение метрики: Q — число строк, подходящих под условие
+    (COUNT(*) FILTER (WHERE ...)), или готовый агрегат. Пустые суммы
+    возвращаются как 0.
+    """
+    aggregates = {
+        name: Count('pk', filter=metric) if isinstance(metric, Q) else metric
+        for name, metric in metrics.items()
+    }
+    summary = queryset.order_by().aggregate(**aggregates)
+    return {name: value or 0 for name, value in summary.items()}
+
+
+def stock_summary(products):
+    summary = report_summary(
+        products,
+        total_products=Count('pk'),
+        low_stock_count=Q(low_stock=True),
+        zero_stock_count=Q(out_of_stock=True),
+    )
+    summary['normal_stock_count'] = summary['total_products'] - summary['low_stock_count']
+    return summary
+
+
+def stock_value_queryset(params):
+    valuations = ProductValuation.objects.filter(quantity__gt=0).select_related('product', 'product__category')
+    if params.get('category'):
+        valuations = valuations.filter(product__category_id=params['category'])
+    return valuations.order_by('product__name', 'product_id')
+
+
+def stock_value_summary(valuations):
+    return report_summary(
+        valuations,
+        products_count=Count('pk'),
+        total_quantity=Sum('quantity'),
+        total_fifo_value=Sum('fifo_value'),
+        total_average_value=Sum('average_value'),
+    )
+
+
+def movement_queryset(params):
+    transactions = StockTransaction.objects.all().select_related('product', 'user')
+
+    if params.get('product'):
+        transactions = transactions.filter(product_id=params['product'])
+
+    date_from, date_to = _date_range(params)
+    if date_from:
+        transactions = transactions.filter(date__gte=_start_of_day(date_from))
+
+    if date_to:
+        transactions = transactions.filter(date__lt=_start_of_day(date_to + timedelta(days=1)))
+
+    if params.get('type'):
+        transactions = transactions.filter(transaction_type=params['type'])
+
+    return transactions
+
+
+def _date_range(params):
+    """Границы периода из фильтров date_from/date_to; оба дня включаются целиком"""
+    date_from = parse_date(params.get('date_from') or '')
+    date_to = parse_date(params.get('date_to') or '')
+    return date_from, date_to
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def movement_summary(params):
+    """Сводка по движению из дневных итогов одним запросом"""
+    movements = DailyStockMovement.objects.all()
+
+    if params.get('product'):
+        movements = movements.filter(product_id=params['product'])
+
+    date_from, date_to = _date_range(params)
+    if date_from:
+        movements = movements.filter(day__gte=date_from)
+
+    if date_to:
+        movements = movements.filter(day__lte=date_to)
+
+    if params.get('type'):
+        movements = movements.filter(transaction_type=params['type'])
+
+    return report_summary(
+        movements,
+        total_transactions=Sum('operation_count'),
+        in_count=Sum('operation_count', filter=Q(transaction_type='in')),
+        out_count=Sum('operation_count', filter=Q(transaction_type='out')),
+        unique_products=Count('product', distinct=True),
+    )
+
+
+def turnover_period(params):
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=int(params.get('period', '30')))
+    return start_date, end_date
+
+
+def turnover_by_type(transaction_type, start_date, end_date):
+    return DailyStockMovement.objects.filter(
+        transaction_type=transaction_type,
+        day__range=[start_date.date(), end_date.date()]
+    ).values('product__name', 'product__sku').annotate(
+        total_quantity=Sum('quantity'),
+        transaction_count=Sum('operation_count')
+    ).order_by('-total_quantity')
+
+
+def inactive_products(params, start_date, end_date):
+    all_products = Product.objects.all()
+    if params.get('category'):
+        all_products = all_products.filter(category_id=params['category'])
+
+    active_product_ids = DailyStockMovement.objects.filter(
+        day__range=[start_date.date(), end_date.date()]
+    ).values_list('product_id', flat=True).distinct()
+
+    return all_products.exclude(id__in=active_product_ids)
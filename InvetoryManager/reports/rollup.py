@@ -0,0 +1,123 @@
+from collections import defaultdict
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from products.models import StockTransaction
+from .models import DailyStockMovement
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def _day(value):
+    if timezone.is_aware(value):
+        return timezone.localdate(value)
+    return value.date()
+
+
+def _movement_deltas(transactions, sign):
+    deltas = defaultdict(lambda: [0, 0])
+    for stock_transaction in transactions:
+        key = (stock_transaction.product_id, _day(stock_transaction.date), stock_transaction.transaction_type)
+        deltas[key][0] += sign * stock_transaction.quantity
+        deltas[key][1] += sign
+    return deltas
+
+
+def _apply_delta(product_id, day, transaction_type, quantity, count):
+    rows = DailyStockMovement.objects.filter(product_id=product_id, day=day, transaction_type=transaction_type)
+    updated = rows.update(quantity=F('quantity') + quantity, operation_count=F('operation_count') + count)
+    if updated:
+        if count < 0:
+            rows.filter(operation_count__lte=0).delete()
+        return
+    if count < 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyStockMovement.objects.create(
+                product_id=product_id, day=day, transaction_type=transaction_type,
+                quantity=quantity, operation_count=count
+            )
+    except IntegrityError:
+        rows.update(quantity=F('quantity') + quantity, operation_count=F('operation_count') + count)
+
+
+def record_movements(transactions, sign=1):
+    """Учет операций в дневных итогах.
+
+    Операции группируются по (товар, день, тип). Одиночная группа
+    обновляется точечным UPDATE; пачка — одним SELECT существующих строк,
+    одним UPDATE через executemany и одним bulk_create новых строк, так что
+    число запросов не зависит от размера пачки. sign=-1 откатывает
+    удаленные операции.
+    """
+    deltas = _movement_deltas(transactions, sign)
+    if len(deltas) <= 1 or sign < 0:
+        for key, (quantity, count) in deltas.items():
+            _apply_delta(*key, quantity, count)
+        return
+
+    product_ids = {product_id for product_id, day, transaction_type in deltas}
+    days = {day for product_id, day, transaction_type in deltas}
+    existing = {
+        (row.product_id, row.day, row.transaction_type): row.pk
+        for row in DailyStockMovement.objects.filter(product_id__in=product_ids, day__in=days).only(
+            'id', 'product_id', 'day', 'transaction_type'
+        )
+    }
+
+    updates = [(quantity, count, existing[key]) for key, (quantity, count) in deltas.items() if key in existing]
+    if updates:
+        sql = 'UPDATE {table} SET {quantity} = {quantity} + %s, {count} = {count} + %s WHERE {id} = %s'.format(
+            table=connection.ops.quote_name(DailyStockMovement._meta.db_table),
+            quantity=connection.ops.quote_name('quantity'),
+            count=connection.ops.quote_name('operation_count'),
+            id=connection.ops.quote_name('id'),
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, updates)
+
+    new_rows = {key: delta for key, delta in deltas.items() if key not in existing}
+    try:
+        with transaction.atomic():
+            DailyStockMovement.objects.bulk_create([
+                DailyStockMovement(
+                    product_id=product_id, day=day, transaction_type=transaction_type,
+                    quantity=quantity, operation_count=count
+                )
+                for (product_id, day, transaction_type), (quantity, count) in new_rows.items()
+            ])
+    except IntegrityError:
+        # Строку за этот день успел создать параллельный запрос
+        for key, (quantity, count) in new_rows.items():
+            _apply_delta(*key, quantity, count)
+
+
+@transaction.atomic
+def rebuild_movements(date_from=None):
+    """Полный пересчет дневных итогов по истории операций"""
+    transactions = StockTransaction.objects.all()
+    existing = DailyStockMovement.objects.all()
+    if date_from:
+        transactions = transactions.filter(date__date__gte=date_from)
+        existing = existing.filter(day__gte=date_from)
+    existing.delete()
+
+    rows = transactions.order_by().annotate(day=TruncDate('date')).values(
+        'product_id', 'day', 'transaction_type'
+    ).annotate(total_quantity=Sum('quantity'), total_count=Count('id'))
+
+    batch = []
+    created = 0
+    for row in rows.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        batch.append(DailyStockMovement(
+            product_id=row['product_id'], day=row['day'], transaction_type=row['transaction_type'],
+            quantity=row['total_quantity'], operation_count=row['total_count']
+        ))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            DailyStockMovement.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    DailyStockMovement.objects.bulk_create(batch)
+    return created + len(batch)
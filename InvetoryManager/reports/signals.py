@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.models import StockTransaction
+from products.signals import stock_transactions_created
+from .rollup import record_movements
+
+
+@receiver(post_save, sender=StockTransaction)
+def add_daily_movement(sender, instance, created, **kwargs):
+    if created:
+        record_movements([instance])
+
+
+@receiver(stock_transactions_created)
+def add_daily_movements(sender, transactions, **kwargs):
+    record_movements(transactions)
+
+
+@receiver(post_delete, sender=StockTransaction)
+def remove_daily_movement(sender, instance, **kwargs):
+    record_movements([instance], sign=-1)
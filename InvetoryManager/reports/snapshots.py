@@ -0,0 +1,140 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from products.models import Product
+from .models import DailyStockMovement, StockSnapshot, StockSnapshotLine
+
+SNAPSHOT_BATCH_SIZE = 2000
+MAX_SERIES_DAYS = 731
+
+
+def _signed(transaction_type, quantity):
+    return quantity if transaction_type == 'in' else -quantity
+
+
+def _net_movements(after=None, until=None, product_ids=None):
+    """Чистое изменение остатка (приход минус расход) по товарам за дни (after, until]"""
+    movements = DailyStockMovement.objects.all()
+    if after is not None:
+        movements = movements.filter(day__gt=after)
+    if until is not None:
+        movements = movements.filter(day__lte=until)
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+
+    deltas = defaultdict(int)
+    rows = movements.order_by().values('product_id', 'transaction_type').annotate(total=Sum('quantity'))
+    for row in rows:
+        deltas[row['product_id']] += _signed(row['transaction_type'], row['total'])
+    return deltas
+
+
+def _current_quantities(product_ids=None):
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    return dict(products.values_list('pk', 'quantity'))
+
+
+def nearest_snapshot(day):
+    return StockSnapshot.objects.filter(day__lte=day).order_by('-day').first()
+
+
+def stock_as_of(day, product_ids=None):
+    """Остатки на конец дня day: {id товара: остаток}.
+
+    Берется ближайший снимок не позже day, и к нему добавляется движение из
+    дневных итогов только за дни после снимка. Если снимка нет, остатки
+    считаются от текущих назад. Для сегодняшней и более поздних дат
+    возвращаются текущие остатки. Без product_ids товары с нулевым остатком
+    могут отсутствовать в результате.
+    """
+    if product_ids is not None:
+        product_ids = list(product_ids)
+
+    if day >= timezone.localdate():
+        quantities = _current_quantities(product_ids)
+    else:
+        snapshot = nearest_snapshot(day)
+        if snapshot is None:
+            quantities = _current_quantities(product_ids)
+            deltas = _net_movements(after=day, product_ids=product_ids)
+            sign = -1
+        else:
+            lines = snapshot.lines.all()
+            if product_ids is not None:
+                lines = lines.filter(product_id__in=product_ids)
+            quantities = dict(lines.values_list('product_id', 'quantity'))
+            deltas = _net_movements(after=snapshot.day, until=day, product_ids=product_ids)
+            sign = 1
+
+        for product_id, delta in deltas.items():
+            quantities[product_id] = quantities.get(product_id, 0) + sign * delta
+
+    if product_ids is not None:
+        return {pk: quantities.get(pk, 0) for pk in product_ids}
+    return quantities
+
+
+def daily_stock_levels(product_id, date_from, date_to):
+    """Остаток товара на конец каждого дня периода: [(день, остаток), ...]"""
+    date_to = min(date_to, timezone.localdate())
+    quantity = stock_as_of(date_from, [product_id])[product_id]
+
+    deltas = defaultdict(int)
+    rows = DailyStockMovement.objects.filter(
+        product_id=product_id, day__gt=date_from, day__lte=date_to
+    ).values_list('day', 'transaction_type', 'quantity')
+    for day, transaction_type, total in rows:
+        deltas[day] += _signed(transaction_type, total)
+
+    levels = [(date_from, quantity)]
+    for offset in range(1, (date_to - date_from).days + 1):
+        day = date_from + timedelta(days=offset)
+        quantity += deltas[day]
+        levels.append((day, quantity))
+    return levels
+
+
+def _save_snapshot(day, quantities):
+    with transaction.atomic():
+        StockSnapshot.objects.filter(day=day).delete()
+        snapshot = StockSnapshot.objects.create(day=day)
+        StockSnapshotLine.objects.bulk_create(
+            [
+                StockSnapshotLine(snapshot=snapshot, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items()
+                if quantity
+            ],
+            batch_size=SNAPSHOT_BATCH_SIZE
+        )
+    return snapshot
+
+
+def build_snapshots(date_from, date_to=None, step=1):
+    """Снимки остатков за прошедшие дни по истории движения.
+
+    Остатки восстанавливаются от текущих назад: для каждого следующего
+    (более раннего) дня вычитается движение только за промежуток до
+    предыдущего снимка. Снимок существующего дня перезаписывается. По
+    умолчанию снимается вчерашний день; step задает шаг между снимками в
+    днях. Операция, проведенная во время построения, может сдвинуть
+    снимок: его можно перестроить повторным запуском. Возвращает число
+    снимков.
+    """
+    yesterday = timezone.localdate() - timedelta(days=1)
+    date_to = min(date_to or yesterday, yesterday)
+
+    quantities = _current_quantities()
+    upper = None
+    created = 0
+    for offset in range(0, (date_to - date_from).days + 1, step):
+        day = date_to - timedelta(days=offset)
+        for product_id, delta in _net_movements(after=day, until=upper).items():
+            quantities[product_id] = quantities.get(product_id, 0) - delta
+        _save_snapshot(day, quantities)
+        upper = day
+        created += 1
+    return created
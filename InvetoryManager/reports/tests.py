@@ -1,3 +1,122 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from datetime import timedelta
+from django.db.models import Count, Q, Sum
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from products.ledger import apply_transactions
+from products.models import Product, StockTransaction
+from .forecast import apply_min_stock, compute_demand, recommend
+from .jobs import run_export_job
+from .models import DailyStockMovement, ExportJob
+from .queries import report_summary, stock_queryset, stock_summary, movement_summary
 
-# Create your tests here.
+User = get_user_model()
+
+
+class ReportSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='admin@example.com', username='admin', password='password', role='admin')
+        cls.products = [
+            Product.objects.create(name=f'Товар {index}', sku=f'G-{index:03d}', price=10, quantity=quantity, min_stock=5)
+            for index, quantity in enumerate([0, 3, 10, 20])
+        ]
+        apply_transactions([
+            StockTransaction(product=cls.products[2], transaction_type='in', quantity=5),
+            StockTransaction(product=cls.products[3], transaction_type='in', quantity=1),
+            StockTransaction(product=cls.products[3], transaction_type='out', quantity=4),
+        ], cls.user)
+
+    def test_report_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            summary = report_summary(
+                Product.objects.all(),
+                total=Count('pk'),
+                low=Q(low_stock=True),
+                quantity=Sum('quantity'),
+            )
+        self.assertEqual(summary, {'total': 4, 'low': 2, 'quantity': 35})
+
+    def test_stock_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            summary = stock_summary(stock_queryset({}))
+        self.assertEqual(summary, {
+            'total_products': 4,
+            'low_stock_count': 2,
+            'zero_stock_count': 1,
+            'normal_stock_count': 2,
+        })
+
+    def test_movement_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            summary = movement_summary({})
+        self.assertEqual(summary, {
+            'total_transactions': 3,
+            'in_count': 2,
+            'out_count': 1,
+            'unique_products': 2,
+        })
+
+    def test_empty_summary_returns_zeros(self):
+        with self.assertNumQueries(1):
+            summary = movement_summary({'type': 'in', 'product': self.products[0].pk})
+        self.assertEqual(summary, {'total_transactions': 0, 'in_count': 0, 'out_count': 0, 'unique_products': 0})
+
+
+class ApplyMinStockTests(TestCase):
+    def test_products_without_demand_keep_min_stock(self):
+        idle = Product.objects.create(name='Без расхода', sku='G-001', price=10, quantity=3, min_stock=7)
+        sold = Product.objects.create(name='С расходом', sku='G-002', price=10, quantity=3, min_stock=7)
+        Product.objects.filter(pk__in=[idle.pk, sold.pk]).update(created_at=timezone.now() - timedelta(days=28))
+        yesterday = timezone.localdate() - timedelta(days=1)
+        DailyStockMovement.objects.bulk_create([
+            DailyStockMovement(product=sold, day=yesterday - timedelta(days=days), transaction_type='out', quantity=4, operation_count=1)
+            for days in range(28)
+        ])
+        sold.refresh_from_db()
+
+        updated = apply_min_stock(recommend(compute_demand()))
+
+        self.assertEqual(updated, 1)
+        idle.refresh_from_db()
+        self.assertEqual(idle.min_stock, 7)
+        changed = Product.objects.get(pk=sold.pk)
+        # Расход 4 в день без разброса, срок поставки 7 дней
+        self.assertEqual(changed.min_stock, 28)
+        self.assertGreater(changed.updated_at, sold.updated_at)
+
+
+class ExportDownloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(email='author@example.com', username='author', password='password', role='manager')
+        cls.other = User.objects.create_user(email='other@example.com', username='other', password='password', role='admin')
+        Product.objects.create(name='Товар', sku='G-001', price=10, quantity=3)
+
+    def _export(self):
+        job = ExportJob.objects.create(created_by=self.author, report='stock', params={})
+        run_export_job(job.pk)
+        job.refresh_from_db()
+        self.addCleanup(job.file.delete, save=False)
+        return job
+
+    def test_export_is_private_and_uniquely_named(self):
+        first, second = self._export(), self._export()
+
+        self.assertNotEqual(first.file.name, second.file.name)
+        self.assertFalse(first.file.path.startswith(str(settings.MEDIA_ROOT)))
+
+    def test_only_author_downloads_export(self):
+        job = self._export()
+        url = reverse('reports:export_job_download', args=[job.pk])
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment; filename="stock_report.xlsx"', response['Content-Disposition'])
+        response.close()
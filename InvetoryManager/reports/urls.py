@@ -5,6 +5,15 @@ app_name = 'reports'
 
 urlpatterns = [
     path('stock/', views.stock_report, name='stock_report'),
+    path('stock/value/', views.stock_value_report, name='stock_value_report'),
+    path('stock/as-of/', views.stock_as_of_report, name='stock_as_of_report'),
+    path('stock/series/<int:pk>/', views.stock_series, name='stock_series'),
     path('movement/', views.movement_report, name='movement_report'),
+    path('forecast/', views.forecast_report, name='forecast_report'),
+    path('forecast/apply/', views.forecast_apply, name='forecast_apply'),
+    path('abc-xyz/', views.abc_xyz_report, name='abc_xyz_report'),
     path('turnover/', views.turnover_report, name='turnover_report'),
+    path('exports/', views.export_job_list, name='export_job_list'),
+    path('exports/<int:pk>/status/', views.export_job_status, name='export_job_status'),
+    path('exports/<int:pk>/download/', views.export_job_download, name='export_job_download'),
 ]
\ No newline at end of file
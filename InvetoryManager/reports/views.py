@@ -1,13 +1,28 @@
-import io
-import openpyxl
-from datetime import datetime, timedelta
-from django.shortcuts import render
-from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
-from django.db.models import Sum, Count, F, Q
+import os
+from datetime import timedelta
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib import messages
+from django.http import FileResponse, Http404, JsonResponse
 from django.core.paginator import Paginator
-from products.models import Product, StockTransaction, Category
-from expenses.models import ExpenseInvoiceItem
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from products.models import Product, Category
+from products.pagination import keyset_paginate
+from users.view_cache import render_cached
+from . import classification
+from .forecast import cached_demand, recommend, select_positions, changed_positions, apply_min_stock
+from .jobs import create_export_job
+from .models import ExportJob
+from .snapshots import stock_as_of, nearest_snapshot, daily_stock_levels, MAX_SERIES_DAYS
+from .queries import (
+    stock_queryset, stock_summary, stock_value_queryset, stock_value_summary, movement_queryset, movement_summary, turnover_period, turnover_by_type, inactive_products
+)
+
+
+def is_admin(user):
+    return user.is_authenticated and user.role == 'admin'
 
 
 @login_required
@@ -16,39 +31,30 @@ def stock_report(request):
     low_stock_only = request.GET.get('low_stock', '')
     export = request.GET.get('export', '')
 
-    products = Product.objects.all().select_related('category')
+    if export == 'excel':
+        return start_export(request, 'stock')
 
-    if category_filter:
-        products = products.filter(category_id=category_filter)
+    def build_context():
+        products = stock_queryset(request.GET)
+        categories = Category.objects.all()
 
-    if low_stock_only:
-        products = products.filter(quantity__lte=F('min_stock'))
+        summary = stock_summary(products)
 
-    categories = Category.objects.all()
+        paginator = Paginator(products, 50)
+        # Число строк уже посчитано в сводке, второй COUNT не нужен
+        paginator.count = summary['total_products']
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
 
-    if export == 'excel':
-        return export_stock_excel(products)
+        return {
+            'products': page_obj,
+            'categories': categories,
+            'category_filter': category_filter,
+            'low_stock_only': low_stock_only,
+            **summary,
+        }
 
-    total_products = products.count()
-    low_stock_count = products.filter(quantity__lte=F('min_stock')).count()
-    zero_stock_count = products.filter(quantity=0).count()
-    normal_stock_count = total_products - low_stock_count
-
-    paginator = Paginator(products, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    context = {
-        'products': page_obj,
-        'categories': categories,
-        'category_filter': category_filter,
-        'low_stock_only': low_stock_only,
-        'total_products': total_products,
-        'low_stock_count': low_stock_count,
-        'zero_stock_count': zero_stock_count,
-        'normal_stock_count': normal_stock_count,
-    }
-    return render(request, 'reports/stock_report.html', context)
+    return render_cached(request, 'stock_report', 'reports/stock_report.html', 'Отчет по остаткам товаров', build_context)
 
 
 @login_required
@@ -59,45 +65,26 @@ def movement_report(request):
     transaction_type = request.GET.get('type', '')
     export = request.GET.get('export', '')
 
-    transactions = StockTransaction.objects.all().select_related('product', 'user')
-
-    if product_id:
-        transactions = transactions.filter(product_id=product_id)
-
-    if date_from:
-        transactions = transactions.filter(date__gte=date_from)
-
-    if date_to:
-        transactions = transactions.filter(date__lte=date_to)
-
-    if transaction_type:
-        transactions = transactions.filter(transaction_type=transaction_type)
-
-    products = Product.objects.all()
-
     if export == 'excel':
-        return export_movement_excel(transactions)
+        return start_export(request, 'movement')
 
-    total_transactions = transactions.count()
-    in_count = transactions.filter(transaction_type='in').count()
-    out_count = transactions.filter(transaction_type='out').count()
-    unique_products = transactions.values('product').distinct().count()
+    transactions = movement_queryset(request.GET)
+    products = Product.objects.all()
 
-    paginator = Paginator(transactions, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    summary = movement_summary(request.GET)
+    page_obj = keyset_paginate(transactions, request.GET.get('cursor'), 50)
+    filter_query = request.GET.copy()
+    filter_query.pop('cursor', None)
 
     context = {
         'transactions': page_obj,
+        'filter_query': filter_query.urlencode(),
         'products': products,
         'product_id': product_id,
         'date_from': date_from,
         'date_to': date_to,
         'transaction_type': transaction_type,
-        'total_transactions': total_transactions,
-        'in_count': in_count,
-        'out_count': out_count,
-        'unique_products': unique_products,
+        **summary,
     }
     return render(request, 'reports/movement_report.html', context)
 
@@ -108,137 +95,250 @@ def turnover_report(request):
     category_filter = request.GET.get('category', '')
     export = request.GET.get('export', '')
 
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=int(period))
+    if export == 'excel':
+        return start_export(request, 'turnover')
 
-    incoming_data = StockTransaction.objects.filter(
-        transaction_type='in',
-        date__range=[start_date, end_date]
-    ).values('product__name', 'product__sku').annotate(
-        total_quantity=Sum('quantity'),
-        transaction_count=Count('id')
-    ).order_by('-total_quantity')
+    def build_context():
+        start_date, end_date = turnover_period(request.GET)
+        popular_products = list(turnover_by_type('out', start_date, end_date)[:10])
+        inactive = inactive_products(request.GET, start_date, end_date)
+        categories = Category.objects.all()
 
-    outgoing_data = StockTransaction.objects.filter(
-        transaction_type='out',
-        date__range=[start_date, end_date]
-    ).values('product__name', 'product__sku').annotate(
-        total_quantity=Sum('quantity'),
-        transaction_count=Count('id')
-    ).order_by('-total_quantity')
+        return {
+            'popular_products': popular_products,
+            'inactive_products': inactive,
+            'period': period,
+            'categories': categories,
+            'category_filter': category_filter,
+            'start_date': start_date,
+            'end_date': end_date,
+        }
 
-    popular_products = list(outgoing_data[:10])
+    return render_cached(request, 'turnover_report', 'reports/turnover_report.html', 'Отчет по обороту товаров', build_context)
 
-    all_products = Product.objects.all()
-    if category_filter:
-        all_products = all_products.filter(category_id=category_filter)
 
-    active_product_ids = StockTransaction.objects.filter(
-        date__range=[start_date, end_date]
-    ).values_list('product_id', flat=True).distinct()
+@login_required
+def forecast_report(request):
+    """Прогноз расхода и рекомендуемые точки заказа"""
+    category_filter = request.GET.get('category', '')
+    reorder_only = request.GET.get('reorder', '')
+
+    def build_context():
+        forecast = recommend(cached_demand())
+        positions = select_positions(
+            forecast, category_filter if category_filter.isdigit() else None, bool(reorder_only)
+        )
+
+        paginator = Paginator(positions, 50)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_rows = [forecast.row(position) for position in page_obj.object_list]
+        products = Product.objects.select_related('category').in_bulk([row['product_id'] for row in page_rows])
+        rows = [
+            {**row, 'product': products[row['product_id']]}
+            for row in page_rows
+            if row['product_id'] in products
+        ]
+
+        filter_query = request.GET.copy()
+        filter_query.pop('page', None)
+
+        return {
+            'rows': rows,
+            'page_obj': page_obj,
+            'filter_query': filter_query.urlencode(),
+            'categories': Category.objects.all(),
+            'category_filter': category_filter,
+            'reorder_only': reorder_only,
+            'total_products': len(positions),
+            'reorder_count': int((forecast.order_quantity[positions] > 0).sum()),
+            'order_total': int(forecast.order_quantity[positions].sum()),
+        }
+
+    return render_cached(request, 'forecast_report', 'reports/forecast_report.html', 'Прогноз и точки заказа', build_context)
+
 
-    inactive_products = all_products.exclude(id__in=active_product_ids)
+@login_required
+@user_passes_test(is_admin)
+def forecast_apply(request):
+    """Запись рекомендуемых точек заказа в минимальный запас"""
+    category_filter = request.GET.get('category', '')
+    reorder_only = request.GET.get('reorder', '')
+
+    forecast = recommend(cached_demand())
+    positions = select_positions(
+        forecast, category_filter if category_filter.isdigit() else None, bool(reorder_only)
+    )
+
+    if request.method == 'POST':
+        updated = apply_min_stock(forecast, positions)
+        messages.success(request, f'Минимальный запас обновлен у {updated} товаров')
+        return redirect(f"{reverse('reports:forecast_report')}?{request.GET.urlencode()}")
 
-    categories = Category.objects.all()
+    changed = len(changed_positions(forecast, positions))
+    return render(request, 'reports/forecast_apply.html', {
+        'changed': changed,
+        'filter_query': request.GET.urlencode(),
+    })
+
+
+@login_required
+def abc_xyz_report(request):
+    """ABC-анализ по стоимости расхода и XYZ-анализ по стабильности спроса"""
+    category_filter = request.GET.get('category', '')
+    abc_filter = request.GET.get('abc', '')
+    xyz_filter = request.GET.get('xyz', '')
+    export = request.GET.get('export', '')
 
     if export == 'excel':
-        return export_turnover_excel(popular_products, inactive_products, period)
+        return start_export(request, 'abc_xyz')
+
+    def build_context():
+        period = classification.period_days(request.GET)
+        category_id = category_filter if category_filter.isdigit() else None
+        result = classification.cached_classification(period)
+        category_positions = classification.select_positions(result, category_id)
+        positions = classification.select_positions(result, category_id, abc_filter, xyz_filter)
+
+        paginator = Paginator(positions, 50)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_rows = [result.row(position) for position in page_obj.object_list]
+        products = Product.objects.select_related('category').in_bulk([row['product_id'] for row in page_rows])
+        rows = [
+            {**row, 'product': products[row['product_id']]}
+            for row in page_rows
+            if row['product_id'] in products
+        ]
+
+        filter_query = request.GET.copy()
+        filter_query.pop('page', None)
+
+        return {
+            'rows': rows,
+            'page_obj': page_obj,
+            'filter_query': filter_query.urlencode(),
+            'categories': Category.objects.all(),
+            'category_filter': category_filter,
+            'abc_filter': abc_filter,
+            'xyz_filter': xyz_filter,
+            'period': period,
+            'period_choices': classification.PERIOD_CHOICES,
+            'classes': classification.CLASSES,
+            'variability_classes': classification.VARIABILITY_CLASSES,
+            'class_matrix': classification.class_matrix(result, category_positions),
+            'start_date': result.start,
+            'end_date': result.end,
+            'total_products': len(positions),
+            'total_value': float(result.value[positions].sum()),
+        }
+
+    return render_cached(request, 'abc_xyz_report', 'reports/abc_xyz_report.html', 'ABC/XYZ-анализ', build_context)
 
-    context = {
-        'popular_products': popular_products,
-        'inactive_products': inactive_products,
-        'period': period,
-        'categories': categories,
-        'category_filter': category_filter,
-        'start_date': start_date,
-        'end_date': end_date,
-    }
-    return render(request, 'reports/turnover_report.html', context)
 
+@login_required
+def stock_value_report(request):
+    """Себестоимость остатков по FIFO и по средневзвешенной цене"""
+    category_filter = request.GET.get('category', '')
 
-def export_stock_excel(products):
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Остатки товаров"
+    valuations = stock_value_queryset(request.GET)
+    summary = stock_value_summary(valuations)
 
-    headers = ['Артикул', 'Наименование', 'Категория', 'Ед. изм.', 'Цена', 'Текущий остаток', 'Мин. запас', 'Статус']
-    for col, header in enumerate(headers, 1):
-        worksheet.cell(row=1, column=col, value=header)
+    paginator = Paginator(valuations, 50)
+    paginator.count = summary['products_count']
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    for row, product in enumerate(products, 2):
-        status = "Низкий запас" if product.quantity <= product.min_stock else "Норма"
+    filter_query = request.GET.copy()
+    filter_query.pop('page', None)
 
-        worksheet.cell(row=row, column=1, value=product.sku)
-        worksheet.cell(row=row, column=2, value=product.name)
-        worksheet.cell(row=row, column=3, value=str(product.category) if product.category else '')
-        worksheet.cell(row=row, column=4, value=product.get_unit_display())
-        worksheet.cell(row=row, column=5, value=float(product.price))
-        worksheet.cell(row=row, column=6, value=product.quantity)
-        worksheet.cell(row=row, column=7, value=product.min_stock)
-        worksheet.cell(row=row, column=8, value=status)
+    return render(request, 'reports/stock_value_report.html', {
+        'valuations': page_obj,
+        'categories': Category.objects.all(),
+        'category_filter': category_filter,
+        'filter_query': filter_query.urlencode(),
+        **summary,
+    })
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="stock_report.xlsx"'
 
-    workbook.save(response)
-    return response
+@login_required
+def stock_as_of_report(request):
+    """Остатки товаров на конец выбранного дня"""
+    today = timezone.localdate()
+    day = min(parse_date(request.GET.get('date') or '') or today, today)
+    category_filter = request.GET.get('category', '')
 
+    products = Product.objects.filter(created_at__date__lte=day).select_related('category').order_by('name', 'pk')
+    if category_filter:
+        products = products.filter(category_id=category_filter)
 
-def export_movement_excel(transactions):
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Движение товаров"
+    page_obj = Paginator(products, 50).get_page(request.GET.get('page'))
+    quantities = stock_as_of(day, [product.pk for product in page_obj])
+    for product in page_obj:
+        product.quantity_as_of = quantities[product.pk]
 
-    headers = ['Дата', 'Товар', 'Артикул', 'Тип операции', 'Количество', 'Пользователь', 'Комментарий']
-    for col, header in enumerate(headers, 1):
-        worksheet.cell(row=1, column=col, value=header)
+    filter_query = request.GET.copy()
+    filter_query.pop('page', None)
 
-    for row, transaction in enumerate(transactions, 2):
-        worksheet.cell(row=row, column=1, value=transaction.date.strftime("%d.%m.%Y %H:%M"))
-        worksheet.cell(row=row, column=2, value=transaction.product.name)
-        worksheet.cell(row=row, column=3, value=transaction.product.sku)
-        worksheet.cell(row=row, column=4, value=transaction.get_transaction_type_display())
-        worksheet.cell(row=row, column=5, value=transaction.quantity)
-        worksheet.cell(row=row, column=6, value=str(transaction.user))
-        worksheet.cell(row=row, column=7, value=transaction.comment)
+    return render(request, 'reports/stock_as_of_report.html', {
+        'products': page_obj,
+        'categories': Category.objects.all(),
+        'category_filter': category_filter,
+        'day': day,
+        'is_today': day == today,
+        'snapshot': nearest_snapshot(day) if day < today else None,
+        'filter_query': filter_query.urlencode(),
+    })
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="movement_report.xlsx"'
 
-    workbook.save(response)
-    return response
+@login_required
+def stock_series(request, pk):
+    """Остаток товара по дням для графика (JSON)"""
+    product = get_object_or_404(Product, pk=pk)
+    date_to = parse_date(request.GET.get('date_to') or '') or timezone.localdate()
+    date_from = parse_date(request.GET.get('date_from') or '') or date_to - timedelta(days=29)
 
+    if date_from > date_to or (date_to - date_from).days >= MAX_SERIES_DAYS:
+        return JsonResponse({'error': f'Период должен быть не длиннее {MAX_SERIES_DAYS} дней'}, status=400)
 
-def export_turnover_excel(popular_products, inactive_products, period):
-    workbook = openpyxl.Workbook()
+    return JsonResponse({
+        'product': product.pk,
+        'sku': product.sku,
+        'name': product.name,
+        'series': [
+            {'day': day.isoformat(), 'quantity': quantity}
+            for day, quantity in daily_stock_levels(product.pk, date_from, date_to)
+        ],
+    })
 
-    ws1 = workbook.active
-    ws1.title = "Популярные товары"
 
-    headers = ['Товар', 'Артикул', 'Количество продаж', 'Количество операций']
-    for col, header in enumerate(headers, 1):
-        ws1.cell(row=1, column=col, value=header)
+def start_export(request, report):
+    params = {key: value for key, value in request.GET.items() if key not in ('export', 'page')}
+    create_export_job(request.user, report, params)
+    messages.success(request, 'Выгрузка поставлена в очередь. Вы получите уведомление, когда файл будет готов.')
+    return redirect('reports:export_job_list')
 
-    for row, product in enumerate(popular_products, 2):
-        ws1.cell(row=row, column=1, value=product['product__name'])
-        ws1.cell(row=row, column=2, value=product['product__sku'])
-        ws1.cell(row=row, column=3, value=product['total_quantity'])
-        ws1.cell(row=row, column=4, value=product['transaction_count'])
 
-    ws2 = workbook.create_sheet("Товары без движения")
+@login_required
+def export_job_list(request):
+    jobs = ExportJob.objects.filter(created_by=request.user)
+    paginator = Paginator(jobs, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'reports/export_job_list.html', {'jobs': page_obj})
 
-    headers = ['Товар', 'Артикул', 'Категория', 'Текущий остаток']
-    for col, header in enumerate(headers, 1):
-        ws2.cell(row=1, column=col, value=header)
 
-    for row, product in enumerate(inactive_products, 2):
-        ws2.cell(row=row, column=1, value=product.name)
-        ws2.cell(row=row, column=2, value=product.sku)
-        ws2.cell(row=row, column=3, value=str(product.category) if product.category else '')
-        ws2.cell(row=row, column=4, value=product.quantity)
+@login_required
+def export_job_download(request, pk):
+    """Файл выгрузки отдается только автору задания"""
+    job = get_object_or_404(ExportJob, pk=pk, created_by=request.user, status='done')
+    if not job.file:
+        raise Http404('Файл выгрузки удален')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
 
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="turnover_report_{period}d.xlsx"'
 
-    workbook.save(response)
-    return response
\ No newline at end of file
+@login_required
+def export_job_status(request, pk):
+    job = get_object_or_404(ExportJob, pk=pk, created_by=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'progress': job.progress,
+        'url': reverse('reports:export_job_download', args=[job.pk]) if job.file else None,
+        'error': job.error,
+    })
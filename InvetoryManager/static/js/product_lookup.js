@@ -0,0 +1,46 @@
+// Автодополнение товаров: поле поиска над <select>, варианты загружаются с сервера.
+// Ответы отдаются с ETag, поэтому повторный запрос того же поиска браузер
+// проверяет условным GET и получает 304 без тела.
+function attachProductLookup(select, onLoaded) {
+    const url = select.dataset.lookupUrl;
+    const search = document.createElement('input');
+    search.type = 'search';
+    search.placeholder = 'Поиск по названию или артикулу';
+    search.className = 'product-search w-full px-3 py-2 mb-1 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500';
+    select.parentNode.insertBefore(search, select);
+
+    let timer = null;
+
+    function load(query) {
+        fetch(`${url}?q=${encodeURIComponent(query)}`, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => {
+                const current = select.value;
+                const currentOption = current ? select.querySelector(`option[value="${current}"]`) : null;
+
+                select.innerHTML = '<option value="">Выберите товар</option>';
+                if (currentOption && !data.results.some(product => String(product.id) === current)) {
+                    select.appendChild(currentOption);
+                }
+                data.results.forEach(product => {
+                    const option = document.createElement('option');
+                    option.value = product.id;
+                    option.dataset.price = product.price;
+                    option.dataset.quantity = product.quantity;
+                    option.textContent = `${product.name} (${product.sku}) - ${product.price} ₽ (остаток: ${product.quantity} ${product.unit})`;
+                    option.selected = String(product.id) === current;
+                    select.appendChild(option);
+                });
+                if (onLoaded) {
+                    onLoaded(select);
+                }
+            });
+    }
+
+    search.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(() => load(search.value.trim()), 250);
+    });
+
+    load('');
+}
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def adjust_counter(key, delta):
+    """Изменить счетчик в кеше на delta; возвращает новое значение или None.
+
+    Отсутствующий счетчик не создается: его посчитают из базы при чтении.
+    Если incr бэкенда не атомарен (settings.CACHE_ATOMIC_INCR), счетчик
+    удаляется, чтобы get + set не потерял параллельные изменения.
+    """
+    if not settings.CACHE_ATOMIC_INCR:
+        cache.delete(key)
+        return None
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        return None
+
+
+def increment(key):
+    """+1 к счетчику, который живет только в кеше (статистика); без атомарного incr не ведется"""
+    if not settings.CACHE_ATOMIC_INCR:
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Первое обращение: если счетчик успел создать другой процесс, add
+        # вернет False и нужен повторный incr
+        if not cache.add(key, 1, None):
+            cache.incr(key)
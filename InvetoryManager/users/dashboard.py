@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.db import transaction
+from products.models import Product, StockTransaction, PurchaseInvoice
+from .cache_counters import adjust_counter
+
+# Счетчики обновляются при записи, а раз в DASHBOARD_TIMEOUT секунд
+# пересчитываются из базы, даже если сверку (reconcile_dashboard) не запускали
+DASHBOARD_TIMEOUT = 3600
+RECENT_TRANSACTIONS_LIMIT = 5
+
+KEYS = {
+    'products_count': 'dashboard:products_count',
+    'low_stock_count': 'dashboard:low_stock_count',
+    'invoices_count': 'dashboard:invoices_count',
+    'recent_transactions': 'dashboard:recent_transactions',
+}
+
+
+def _user_name(user):
+    if user is None:
+        return ''
+    return user.get_full_name() or user.email
+
+
+def _recent_transactions():
+    transactions = StockTransaction.objects.select_related('product', 'user').order_by('-date')[:RECENT_TRANSACTIONS_LIMIT]
+    return [
+        {
+            'date': stock_transaction.date,
+            'product_name': stock_transaction.product.name,
+            'transaction_type': stock_transaction.transaction_type,
+            'transaction_type_display': stock_transaction.get_transaction_type_display(),
+            'quantity': stock_transaction.quantity,
+            'user_name': _user_name(stock_transaction.user),
+        }
+        for stock_transaction in transactions
+    ]
+
+
+COMPUTE = {
+    'products_count': lambda: Product.objects.count(),
+    'low_stock_count': lambda: Product.objects.filter(low_stock=True).count(),
+    'invoices_count': lambda: PurchaseInvoice.objects.count(),
+    'recent_transactions': _recent_transactions,
+}
+
+
+def get_metrics():
+    """Показатели главной страницы одним чтением из кеша.
+
+    Отсутствующие в кеше показатели считаются из базы и сохраняются.
+    """
+    cached = cache.get_many(KEYS.values())
+    metrics, missing = {}, {}
+    for name, key in KEYS.items():
+        if key in cached:
+            metrics[name] = cached[key]
+        else:
+            metrics[name] = missing[key] = COMPUTE[name]()
+    if missing:
+        cache.set_many(missing, DASHBOARD_TIMEOUT)
+    return metrics
+
+
+def reconcile_metrics():
+    """Пересчет всех показателей из базы: {name: (в кеше, в базе)}"""
+    cached = cache.get_many(KEYS.values())
+    actual = {name: COMPUTE[name]() for name in KEYS}
+    cache.set_many({KEYS[name]: value for name, value in actual.items()}, DASHBOARD_TIMEOUT)
+    return {name: (cached.get(KEYS[name]), value) for name, value in actual.items()}
+
+
+def adjust(name, delta):
+    """Изменить счетчик после коммита; если его нет в кеше, он будет посчитан при чтении"""
+    if delta:
+        transaction.on_commit(lambda: adjust_counter(KEYS[name], delta))
+
+
+def invalidate(*names):
+    transaction.on_commit(lambda: cache.delete_many([KEYS[name] for name in names]))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from users.dashboard import reconcile_metrics
+
+
+class Command(BaseCommand):
+    help = 'Сверка счетчиков главной страницы с базой (запускать периодически, например из cron)'
+
+    def handle(self, *args, **options):
+        for name, (cached, actual) in reconcile_metrics().items():
+            if name == 'recent_transactions':
+                continue
+            if cached is None:
+                self.stdout.write(f'{name}: {actual} (не было в кеше)')
+            elif cached != actual:
+                self.stdout.write(self.style.WARNING(f'{name}: {cached} -> {actual}'))
+            else:
+                self.stdout.write(f'{name}: {actual}')
+        self.stdout.write(self.style.SUCCESS('Счетчики главной страницы обновлены'))
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from expenses.models import ExpenseInvoice, ExpenseReason
+from products.models import Product, Category, Supplier, StockTransaction, PurchaseInvoice
+from products.signals import stock_transactions_created
+from . import dashboard, view_cache
+
+
+def _is_low(quantity, min_stock):
+    return quantity <= min_stock
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    is_low = _is_low(instance.quantity, instance.min_stock)
+    if created:
+        dashboard.adjust('products_count', 1)
+        dashboard.adjust('low_stock_count', int(is_low))
+    else:
+        loaded_quantity, loaded_min_stock = getattr(instance, '_loaded_stock', (None, None))
+        if loaded_quantity is None or loaded_min_stock is None:
+            dashboard.invalidate('low_stock_count')
+        else:
+            dashboard.adjust('low_stock_count', int(is_low) - int(_is_low(loaded_quantity, loaded_min_stock)))
+        # Название товара выводится в последних операциях
+        dashboard.invalidate('recent_transactions')
+    instance._loaded_stock = (instance.quantity, instance.min_stock)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    dashboard.adjust('products_count', -1)
+    dashboard.adjust('low_stock_count', -int(_is_low(instance.quantity, instance.min_stock)))
+    dashboard.invalidate('recent_transactions')
+
+
+@receiver(stock_transactions_created)
+def stock_changed(sender, transactions, **kwargs):
+    """Остатки меняются UPDATE без post_save: переходы через минимум
+    определяются по новому остатку и изменению за операцию"""
+    deltas = defaultdict(int)
+    for stock_transaction in transactions:
+        sign = 1 if stock_transaction.transaction_type == 'in' else -1
+        deltas[stock_transaction.product_id] += sign * stock_transaction.quantity
+
+    change = 0
+    for pk, quantity, min_stock in Product.objects.filter(pk__in=deltas).values_list('pk', 'quantity', 'min_stock'):
+        change += int(_is_low(quantity, min_stock)) - int(_is_low(quantity - deltas[pk], min_stock))
+    dashboard.adjust('low_stock_count', change)
+    dashboard.invalidate('recent_transactions')
+
+
+@receiver(post_save, sender=StockTransaction)
+@receiver(post_delete, sender=StockTransaction)
+def stock_transaction_changed(sender, instance, **kwargs):
+    dashboard.invalidate('recent_transactions')
+
+
+@receiver(post_save, sender=PurchaseInvoice)
+def invoice_saved(sender, instance, created, **kwargs):
+    if created:
+        dashboard.adjust('invoices_count', 1)
+
+
+@receiver(post_delete, sender=PurchaseInvoice)
+def invoice_deleted(sender, instance, **kwargs):
+    dashboard.adjust('invoices_count', -1)
+
+
+# Группы кешируемых страниц (users/view_cache.py), которые сбрасывает запись в модель
+INVALIDATED_GROUPS = {
+    Product: ('products',),
+    Category: ('categories',),
+    Supplier: ('suppliers',),
+    StockTransaction: ('stock', 'products'),
+    PurchaseInvoice: ('invoices',),
+    ExpenseInvoice: ('invoices',),
+    ExpenseReason: ('expense_reasons',),
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_view_cache(sender, **kwargs):
+    groups = INVALIDATED_GROUPS.get(sender)
+    if groups:
+        view_cache.invalidate(*groups)
+
+
+@receiver(stock_transactions_created)
+def invalidate_view_cache_after_transactions(sender, **kwargs):
+    view_cache.invalidate(*INVALIDATED_GROUPS[StockTransaction])
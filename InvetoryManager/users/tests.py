@@ -1,3 +1,37 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from .cache_counters import adjust_counter, increment
+from .view_cache import _versions, invalidate
 
-# Create your tests here.
+
+class CacheCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(CACHE_ATOMIC_INCR=True)
+    def test_counter_is_incremented_with_atomic_incr(self):
+        cache.set('counter', 5)
+
+        self.assertEqual(adjust_counter('counter', 2), 7)
+        increment('hits')
+        increment('hits')
+
+        self.assertEqual(cache.get_many(['counter', 'hits']), {'counter': 7, 'hits': 2})
+
+    @override_settings(CACHE_ATOMIC_INCR=False)
+    def test_counter_is_dropped_without_atomic_incr(self):
+        """get + set потерял бы параллельные изменения, поэтому счетчик пересчитывается из базы"""
+        cache.set('counter', 5)
+
+        self.assertIsNone(adjust_counter('counter', 2))
+        increment('hits')
+
+        self.assertEqual(cache.get_many(['counter', 'hits']), {})
+
+    def test_invalidate_changes_group_version(self):
+        before = _versions(['products'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate('products')
+
+        self.assertNotEqual(_versions(['products']), before)
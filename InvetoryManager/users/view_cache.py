@@ -0,0 +1,117 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from .cache_counters import increment
+
+# Кешируемые страницы и группы данных, от которых зависит их содержимое.
+# Запись в модель группы (см. users/signals.py) сбрасывает все страницы группы.
+CACHED_VIEWS = {
+    'stock_report': ('products', 'categories'),
+    'turnover_report': ('products', 'categories', 'stock'),
+    'forecast_report': ('products', 'categories', 'stock'),
+    'abc_xyz_report': ('products', 'categories', 'stock'),
+    'supplier_list': ('suppliers',),
+    'expense_reason_list': ('expense_reasons',),
+}
+
+
+def _timeout():
+    return getattr(settings, 'VIEW_CACHE_TIMEOUT', 300)
+
+
+def _version_key(group):
+    return f'view-cache:version:{group}'
+
+
+def _stats_key(name, outcome):
+    return f'view-cache:stats:{name}:{outcome}'
+
+
+def _versions(groups):
+    keys = [_version_key(group) for group in groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Начальная версия из времени, чтобы после вытеснения ключа не
+            # вернуться к номеру, под которым уже лежат устаревшие страницы
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [str(versions[key]) for key in keys]
+
+
+def invalidate(*groups):
+    """Сбросить страницы, зависящие от групп, после коммита транзакции.
+
+    Новая версия — время, а не incr: запись атомарна в любом бэкенде, а
+    двум параллельным сбросам достаточно, чтобы версия сменилась.
+    """
+    def bump():
+        cache.set_many({_version_key(group): time.time_ns() for group in groups}, None)
+
+    transaction.on_commit(bump)
+
+
+def cache_key(request, name):
+    role = getattr(request.user, 'role', '') or ''
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return ':'.join(['view-cache', name, role, *_versions(CACHED_VIEWS[name]), digest])
+
+
+def render_cached(request, name, template_name, title, build_context):
+    """Страница с кешированным содержимым.
+
+    template_name рендерится без base.html и кешируется по роли
+    пользователя и параметрам запроса; build_context вызывается только при
+    промахе. Оформление страницы (имя пользователя, сообщения) рендерится
+    на каждый запрос через users/cached_page.html.
+    """
+    key = cache_key(request, name)
+    content = cache.get(key)
+    if content is None:
+        increment(_stats_key(name, 'misses'))
+        content = render_to_string(template_name, build_context(), request)
+        cache.set(key, content, _timeout())
+    else:
+        increment(_stats_key(name, 'hits'))
+
+    return render(request, 'users/cached_page.html', {'title': title, 'content': mark_safe(content)})
+
+
+def cached_value(name, groups, build):
+    """Результат build(), кешируемый до записи в группы данных.
+
+    Версии групп входят в ключ так же, как у страниц, поэтому значение
+    сбрасывается вместе с кешированными страницами этих групп.
+    """
+    key = ':'.join(['view-cache:value', name, *_versions(groups)])
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def view_cache_stats():
+    """Попадания и промахи кеша по страницам: {name: {'hits', 'misses', 'hit_ratio'}}.
+
+    Ведутся только при атомарном incr бэкенда (settings.CACHE_ATOMIC_INCR).
+    """
+    keys = [_stats_key(name, outcome) for name in CACHED_VIEWS for outcome in ('hits', 'misses')]
+    counters = cache.get_many(keys)
+    stats = {}
+    for name in CACHED_VIEWS:
+        hits = counters.get(_stats_key(name, 'hits'), 0)
+        misses = counters.get(_stats_key(name, 'misses'), 0)
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
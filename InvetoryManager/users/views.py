@@ -2,12 +2,14 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db import models
 from .forms import CustomUserCreationForm
 from django.urls import reverse_lazy
 from django.contrib.auth.views import PasswordResetView, PasswordResetDoneView, PasswordResetConfirmView, PasswordResetCompleteView
 from .forms import CustomPasswordResetForm, CustomSetPasswordForm
-from products.models import Product, StockTransaction, PurchaseInvoice
+from django.conf import settings
+from django.http import JsonResponse
+from .dashboard import get_metrics
+from .view_cache import view_cache_stats
 
 def is_admin(user):
     return user.is_authenticated and user.role == 'admin'
@@ -57,20 +59,18 @@ def register_view(request):
 
 @login_required
 def home_view(request):
-    products_count = Product.objects.count()
-    low_stock_count = Product.objects.filter(quantity__lte=models.F('min_stock')).count()
-    invoices_count = PurchaseInvoice.objects.count()
-    recent_transactions = StockTransaction.objects.select_related('product', 'user').order_by('-date')[:5]
     context = {
         'user': request.user,
-        'products_count': products_count,
-        'low_stock_count': low_stock_count,
-        'invoices_count': invoices_count,
-        'recent_transactions': recent_transactions,
+        **get_metrics(),
     }
     return render(request, 'users/home.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def cache_stats(request):
+    """Попадания и промахи кеша страниц для мониторинга"""
+    return JsonResponse({'enabled': settings.CACHE_ATOMIC_INCR, 'views': view_cache_stats()})
 
 
 class CustomPasswordResetView(PasswordResetView):